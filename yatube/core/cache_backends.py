@@ -0,0 +1,296 @@
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# При смене схемы старый файл кэша пересоздаётся: данные в нём одноразовые
+SCHEMA_VERSION = 2
+SCHEMA = (
+    'DROP TABLE IF EXISTS cache',
+    'DROP TABLE IF EXISTS cache_stats',
+    # size стоит перед value: чтение size не листает overflow-страницы BLOB
+    'CREATE TABLE cache ('
+    ' key TEXT PRIMARY KEY,'
+    ' expires REAL,'
+    ' accessed REAL NOT NULL,'
+    ' size INTEGER NOT NULL,'
+    ' value BLOB NOT NULL)',
+    'CREATE INDEX cache_accessed ON cache (accessed)',
+    'CREATE INDEX cache_expires ON cache (expires)',
+    # Число и суммарный размер записей ведут триггеры, чтобы проверка
+    # переполнения не считала COUNT(*) и SUM(size) по всей таблице
+    'CREATE TABLE cache_stats ('
+    ' id INTEGER PRIMARY KEY CHECK (id = 0),'
+    ' count INTEGER NOT NULL,'
+    ' size INTEGER NOT NULL)',
+    'INSERT INTO cache_stats VALUES (0, 0, 0)',
+    'CREATE TRIGGER cache_insert AFTER INSERT ON cache BEGIN'
+    ' UPDATE cache_stats SET count = count + 1, size = size + NEW.size;'
+    ' END',
+    'CREATE TRIGGER cache_delete AFTER DELETE ON cache BEGIN'
+    ' UPDATE cache_stats SET count = count - 1, size = size - OLD.size;'
+    ' END',
+    'CREATE TRIGGER cache_resize AFTER UPDATE OF size ON cache BEGIN'
+    ' UPDATE cache_stats SET size = size - OLD.size + NEW.size;'
+    ' END',
+    f'PRAGMA user_version = {SCHEMA_VERSION}',
+)
+# Сколько ключей подставлять в один WHERE key IN (...)
+KEYS_PER_QUERY = 500
+# Время чтения обновляется не чаще раза в столько секунд: иначе каждое
+# попадание брало бы блокировку на запись общего файла
+ACCESS_RESOLUTION = 60
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite, общий для всех процессов на одной машине.
+
+    В отличие от LocMemCache, воркеры gunicorn видят одни и те же
+    записи. Объём ограничен числом записей (MAX_ENTRIES) и суммарным
+    размером значений в байтах (OPTIONS['MAX_SIZE']); при переполнении
+    вытесняются давно не читавшиеся записи (LRU с точностью
+    до ACCESS_RESOLUTION секунд).
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._path = location
+        options = params.get('OPTIONS', {})
+        self._max_size = int(options.get('MAX_SIZE', 64 * 1024 * 1024))
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self._path, timeout=30, isolation_level=None
+            )
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._install(connection)
+            self._local.connection = connection
+        return connection
+
+    @staticmethod
+    def _install(connection):
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            version = connection.execute('PRAGMA user_version').fetchone()[0]
+            if version != SCHEMA_VERSION:
+                for statement in SCHEMA:
+                    connection.execute(statement)
+        finally:
+            connection.execute('COMMIT')
+
+    def _write(self):
+        """Транзакция, сразу берущая блокировку на запись."""
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        return db
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _read(self, db, key, now):
+        """Значение и время последнего чтения, или None."""
+        row = db.execute(
+            'SELECT value, expires, accessed FROM cache WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None or row[1] is not None and row[1] <= now:
+            return None
+        return row[0], row[2]
+
+    @staticmethod
+    def _mark_accessed(db, keys, now):
+        """Отмечает чтение только у записей, отмеченных давно."""
+        if keys:
+            db.execute(
+                'UPDATE cache SET accessed = ? WHERE key IN '
+                f'({", ".join("?" * len(keys))})',
+                (now, *keys),
+            )
+
+    @staticmethod
+    def _chunks(keys):
+        keys = list(keys)
+        for start in range(0, len(keys), KEYS_PER_QUERY):
+            chunk = keys[start:start + KEYS_PER_QUERY]
+            yield chunk, ', '.join('?' * len(chunk))
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        db = self._db
+        row = self._read(db, key, now)
+        if row is None:
+            return default
+        value, accessed = row
+        if now - accessed >= ACCESS_RESOLUTION:
+            self._mark_accessed(db, [key], now)
+        return pickle.loads(value)
+
+    def get_many(self, keys, version=None):
+        """Все ключи одним SELECT ... WHERE key IN на каждые 500 ключей."""
+        made = {self._key(key, version): key for key in keys}
+        now = time.time()
+        db = self._db
+        found = {}
+        for chunk, marks in self._chunks(made):
+            rows = db.execute(
+                'SELECT key, value, accessed FROM cache'
+                f' WHERE key IN ({marks})'
+                ' AND (expires IS NULL OR expires > ?)',
+                (*chunk, now),
+            ).fetchall()
+            for key, value, _ in rows:
+                found[made[key]] = pickle.loads(value)
+            self._mark_accessed(db, [
+                key for key, _, accessed in rows
+                if now - accessed >= ACCESS_RESOLUTION
+            ], now)
+        return found
+
+    def _store(self, db, key, value, timeout, replace):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if len(value) > self._max_size:
+            return False
+        if replace:
+            statement = (
+                'INSERT INTO cache (key, expires, accessed, size, value) '
+                'VALUES (?, ?, ?, ?, ?) ON CONFLICT (key) DO UPDATE SET '
+                'expires = excluded.expires, accessed = excluded.accessed, '
+                'size = excluded.size, value = excluded.value'
+            )
+        else:
+            statement = (
+                'INSERT OR IGNORE INTO cache '
+                '(key, expires, accessed, size, value) VALUES (?, ?, ?, ?, ?)'
+            )
+        cursor = db.execute(statement, (
+            key, self.get_backend_timeout(timeout), time.time(),
+            len(value), value,
+        ))
+        return bool(cursor.rowcount)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        db = self._write()
+        try:
+            if self._store(db, key, value, timeout, replace=True):
+                self._cull(db, time.time())
+        finally:
+            db.execute('COMMIT')
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        """Все записи одной транзакцией и с одной проверкой переполнения."""
+        failed = []
+        db = self._write()
+        try:
+            for key, value in data.items():
+                if not self._store(
+                    db, self._key(key, version), value, timeout, replace=True
+                ):
+                    failed.append(key)
+            self._cull(db, time.time())
+        finally:
+            db.execute('COMMIT')
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        db = self._write()
+        try:
+            db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time()),
+            )
+            stored = self._store(db, key, value, timeout, replace=False)
+            if stored:
+                self._cull(db, time.time())
+            return stored
+        finally:
+            db.execute('COMMIT')
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        db = self._write()
+        try:
+            row = self._read(db, key, time.time())
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            new_value = pickle.loads(row[0]) + delta
+            value = pickle.dumps(new_value, pickle.HIGHEST_PROTOCOL)
+            db.execute(
+                'UPDATE cache SET size = ?, value = ? WHERE key = ?',
+                (len(value), value, key),
+            )
+            return new_value
+        finally:
+            db.execute('COMMIT')
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        db = self._write()
+        try:
+            cursor = db.execute(
+                'UPDATE cache SET expires = ? '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time()),
+            )
+            return bool(cursor.rowcount)
+        finally:
+            db.execute('COMMIT')
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._read(self._db, key, time.time()) is not None
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        self._db.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        db = self._write()
+        try:
+            for chunk, marks in self._chunks(
+                self._key(key, version) for key in keys
+            ):
+                db.execute(f'DELETE FROM cache WHERE key IN ({marks})', chunk)
+        finally:
+            db.execute('COMMIT')
+
+    def clear(self):
+        self._db.execute('DELETE FROM cache')
+
+    def _over_limit(self, db):
+        count, size = db.execute(
+            'SELECT count, size FROM cache_stats'
+        ).fetchone()
+        return count > self._max_entries or size > self._max_size, count
+
+    def _cull(self, db, now):
+        """При переполнении убирает просроченные, потом давно читанные.
+
+        Число и размер записей читаются из строки cache_stats,
+        так что запись без переполнения ничего не обходит.
+        """
+        if not self._over_limit(db)[0]:
+            return
+        db.execute('DELETE FROM cache WHERE expires <= ?', (now,))
+        while True:
+            over, count = self._over_limit(db)
+            if not over:
+                return
+            if self._cull_frequency == 0:
+                db.execute('DELETE FROM cache')
+                return
+            db.execute(
+                'DELETE FROM cache WHERE key IN ('
+                ' SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+                (max(1, count // self._cull_frequency),),
+            )
@@ -0,0 +1,75 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils.module_loading import import_string
+
+PAYLOAD = b'x' * 2048
+
+
+def _make_cache(config):
+    backend = import_string(config['BACKEND'])
+    return backend(config.get('LOCATION', ''), config)
+
+
+def _worker(config, requests, keys, seed):
+    """Один воркер: читает популярные ключи чаще, при промахе пишет."""
+    cache = _make_cache(config)
+    rng = random.Random(seed)
+    hits = 0
+    started = time.perf_counter()
+    for _ in range(requests):
+        key = f'bench:{min(int(rng.expovariate(10 / keys)), keys - 1)}'
+        if cache.get(key) is None:
+            cache.set(key, PAYLOAD, 300)
+        else:
+            hits += 1
+    return hits, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает долю попаданий в кэш у бэкендов из '
+        'settings.CACHE_BACKENDS при разном числе процессов-воркеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backends', nargs='+', default=sorted(settings.CACHE_BACKENDS),
+        )
+        parser.add_argument(
+            '--workers', nargs='+', type=int, default=[1, 2, 4, 8],
+        )
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--keys', type=int, default=500)
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"backend":<10}{"workers":>8}{"hit rate":>10}{"ops/s":>12}'
+        )
+        for name in options['backends']:
+            for workers in options['workers']:
+                hit_rate, ops = self.run(name, workers, options)
+                self.stdout.write(
+                    f'{name:<10}{workers:>8}{hit_rate:>10.1%}{ops:>12.0f}'
+                )
+
+    def run(self, name, workers, options):
+        config = dict(settings.CACHE_BACKENDS[name])
+        with tempfile.TemporaryDirectory() as directory:
+            if 'LOCATION' in config:
+                config['LOCATION'] = os.path.join(directory, 'bench.cache')
+            jobs = [
+                (config, options['requests'], options['keys'], seed)
+                for seed in range(workers)
+            ]
+            with multiprocessing.Pool(workers) as pool:
+                results = pool.starmap(_worker, jobs)
+        hits = sum(hit for hit, _ in results)
+        elapsed = max(seconds for _, seconds in results)
+        total = workers * options['requests']
+        return hits / total, total / elapsed
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.template_warmup import warm_templates
+
+
+class Command(BaseCommand):
+    help = (
+        'Разбирает все шаблоны и завершается с ошибкой, если какой-то '
+        'не компилируется. Запускайте перед выкладкой.'
+    )
+
+    def handle(self, *args, **options):
+        count, errors = warm_templates()
+        for name, error in errors.items():
+            self.stderr.write(f'{name}: {error}')
+        if errors:
+            raise CommandError(
+                f'Не компилируются шаблоны: {len(errors)} из {count}'
+            )
+        self.stdout.write(f'Шаблонов разобрано: {count}')
@@ -0,0 +1,161 @@
+import heapq
+import threading
+import time
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import Template
+
+SLOWEST_QUERIES = 5
+# Последние запросы этого процесса, см. core.views.profiling
+RECENT = deque(maxlen=getattr(settings, 'PROFILING_BUFFER_SIZE', 200))
+
+_local = threading.local()
+
+
+class Profile:
+    """Что успел сделать один запрос: SQL, шаблоны и кэш."""
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.slowest = []
+        self.template_time = 0.0
+        self.rendering = False
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.counting_cache = True
+
+    def record_query(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.queries += 1
+            self.query_time += duration
+            if len(self.slowest) < SLOWEST_QUERIES:
+                heapq.heappush(self.slowest, (duration, sql))
+            else:
+                heapq.heappushpop(self.slowest, (duration, sql))
+
+    def count_cache(self, value, default):
+        if self.counting_cache:
+            if value is default:
+                self.cache_misses += 1
+            else:
+                self.cache_hits += 1
+
+    @contextmanager
+    def watch_cache(self, backend):
+        """Считает попадания в кэш этого потока, пока идёт запрос."""
+        get, get_many = backend.get, backend.get_many
+
+        def counted_get(key, default=None, version=None):
+            value = get(key, default, version)
+            self.count_cache(value, default)
+            return value
+
+        def counted_get_many(keys, version=None):
+            keys = list(keys)
+            # Базовый get_many сам зовёт get; такие вызовы не считаем
+            self.counting_cache = False
+            try:
+                found = get_many(keys, version)
+            finally:
+                self.counting_cache = True
+            self.cache_hits += len(found)
+            self.cache_misses += len(keys) - len(found)
+            return found
+
+        backend.get, backend.get_many = counted_get, counted_get_many
+        try:
+            yield
+        finally:
+            del backend.get, backend.get_many
+
+    def server_timing(self, total):
+        return ', '.join((
+            f'db;dur={self.query_time * 1000:.1f};'
+            f'desc="{self.queries} queries"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'cache;desc="{self.cache_hits} hits, '
+            f'{self.cache_misses} misses"',
+            f'total;dur={total * 1000:.1f}',
+        ))
+
+    def summary(self, request, response, total):
+        return {
+            'time': time.time(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'total': total * 1000,
+            'queries': self.queries,
+            'query_time': self.query_time * 1000,
+            'slowest': [
+                (duration * 1000, sql)
+                for duration, sql in sorted(self.slowest, reverse=True)
+            ],
+            'template_time': self.template_time * 1000,
+            'cache_hits': self.cache_hits,
+            'cache_misses': self.cache_misses,
+        }
+
+
+def _timed_render(render):
+    @wraps(render)
+    def wrapper(*args, **kwargs):
+        profile = getattr(_local, 'profile', None)
+        # Вложенный рендеринг уже учтён во внешнем
+        if profile is None or profile.rendering:
+            return render(*args, **kwargs)
+        profile.rendering = True
+        started = time.perf_counter()
+        try:
+            return render(*args, **kwargs)
+        finally:
+            profile.template_time += time.perf_counter() - started
+            profile.rendering = False
+    wrapper.timed = True
+    return wrapper
+
+
+class ProfilingMiddleware:
+    """Замеряет запросы к БД, рендеринг и кэш для каждого запроса.
+
+    Включается настройкой PROFILING; выключенный не остаётся в цепочке
+    middleware вовсе. Итоги уходят в заголовок Server-Timing и в
+    кольцевой буфер RECENT.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if not getattr(Template.render, 'timed', False):
+            Template.render = _timed_render(Template.render)
+
+    def __call__(self, request):
+        profile = Profile()
+        _local.profile = profile
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(profile.record_query)
+                    )
+                stack.enter_context(profile.watch_cache(caches['default']))
+                response = self.get_response(request)
+        finally:
+            _local.profile = None
+        total = time.perf_counter() - started
+        response['Server-Timing'] = profile.server_timing(total)
+        RECENT.append(profile.summary(request, response, total))
+        return response
@@ -0,0 +1,125 @@
+import shutil
+import sqlite3
+import tempfile
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.cache_backends import ACCESS_RESOLUTION, SQLiteCache
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = self.make_cache()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def make_cache(self, **options):
+        return SQLiteCache(
+            f'{self.directory}/cache.sqlite3', {'OPTIONS': options}
+        )
+
+    def test_set_get_add_incr_delete(self):
+        """Базовые операции кэша работают."""
+        self.cache.set('key', {'a': 1})
+        self.assertEqual(self.cache.get('key'), {'a': 1})
+        self.assertFalse(self.cache.add('key', 'другое'))
+        self.assertTrue(self.cache.add('counter', 1))
+        self.assertEqual(self.cache.incr('counter', 2), 3)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_expired_entries_are_gone(self):
+        """Просроченная запись не читается и не мешает add."""
+        self.cache.set('key', 'value', 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(self.cache.get('key'))
+        self.assertTrue(self.cache.add('key', 'new'))
+
+    def test_processes_share_entries(self):
+        """Второй экземпляр видит записи первого."""
+        self.cache.set('shared', 'value')
+        self.assertEqual(self.make_cache().get('shared'), 'value')
+
+    def test_least_recently_used_is_evicted(self):
+        """При переполнении вытесняются давно не читавшиеся записи."""
+        cache = self.make_cache(MAX_ENTRIES=3, CULL_FREQUENCY=3)
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        later = time.time() + ACCESS_RESOLUTION
+        with mock.patch('time.time', return_value=later):
+            cache.get('a')
+        cache.set('d', 'd')
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 'a')
+        self.assertEqual(cache.get('d'), 'd')
+
+    def test_recent_reads_do_not_write(self):
+        """Частые чтения не обновляют accessed и не пишут в файл."""
+        self.cache.set('key', 'value')
+        self.cache.get('key')
+        db = self.cache._db
+        writes = db.total_changes
+        for _ in range(3):
+            self.cache.get('key')
+            self.cache.get_many(['key'])
+        self.assertEqual(db.total_changes, writes)
+        later = time.time() + ACCESS_RESOLUTION
+        with mock.patch('time.time', return_value=later):
+            self.cache.get_many(['key'])
+        self.assertEqual(db.total_changes, writes + 1)
+
+    def test_size_limit(self):
+        """Суммарный размер значений не превышает MAX_SIZE."""
+        cache = self.make_cache(MAX_SIZE=3000, CULL_FREQUENCY=2)
+        cache.set('big', b'x' * 5000)
+        self.assertIsNone(cache.get('big'))
+        cache.set('first', b'x' * 1400)
+        cache.set('second', b'x' * 1400)
+        cache.set('third', b'x' * 1400)
+        self.assertIsNone(cache.get('first'))
+        self.assertIsNotNone(cache.get('third'))
+
+    def test_get_many_and_set_many(self):
+        """Пачки ключей читаются и пишутся одним запросом."""
+        self.assertEqual(self.cache.set_many({'a': 1, 'b': 2}), [])
+        self.cache.set('expired', 3, 0.01)
+        time.sleep(0.02)
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'expired', 'missing']),
+            {'a': 1, 'b': 2},
+        )
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_stats_follow_every_write(self):
+        """Счётчики переполнения совпадают с содержимым таблицы."""
+        self.cache.set('a', 'x' * 100)
+        self.cache.set('a', 'x' * 10)
+        self.cache.add('counter', 9)
+        self.cache.incr('counter', 1000)
+        self.cache.set_many({'b': 'b', 'c': 'c'})
+        self.cache.delete('b')
+        db = self.cache._db
+        self.assertEqual(
+            db.execute('SELECT count, size FROM cache_stats').fetchone(),
+            db.execute('SELECT COUNT(*), SUM(size) FROM cache').fetchone(),
+        )
+
+    def test_old_schema_is_replaced(self):
+        """Файл со старой схемой пересоздаётся при подключении."""
+        path = f'{self.directory}/old.sqlite3'
+        connection = sqlite3.connect(path)
+        connection.execute(
+            'CREATE TABLE cache (key TEXT PRIMARY KEY, value BLOB)'
+        )
+        connection.commit()
+        connection.close()
+        cache = SQLiteCache(path, {})
+        cache.set('key', 'value')
+        self.assertEqual(cache.get('key'), 'value')
@@ -0,0 +1,57 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from core.profiling import RECENT
+from posts.models import Post
+
+User = get_user_model()
+
+
+class ProfilingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='profiled')
+        cls.admin = User.objects.create_user(
+            username='profiling_admin', is_staff=True
+        )
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        RECENT.clear()
+        # Главная читает из кэша поколение и готовую страницу
+        self.url = reverse('posts:index')
+
+    def test_disabled_by_default(self):
+        """Без PROFILING middleware не добавляет заголовков."""
+        response = Client().get(self.url)
+        self.assertFalse(response.has_header('Server-Timing'))
+        self.assertFalse(RECENT)
+
+    @override_settings(PROFILING=True)
+    def test_records_queries_templates_and_cache(self):
+        """Запрос попадает в Server-Timing и в кольцевой буфер."""
+        response = Client().get(self.url)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        entry = RECENT[-1]
+        self.assertEqual(entry['path'], self.url)
+        self.assertGreater(entry['queries'], 0)
+        self.assertTrue(entry['slowest'])
+        self.assertGreater(entry['template_time'], 0)
+        self.assertGreater(entry['cache_hits'] + entry['cache_misses'], 0)
+
+    @override_settings(PROFILING=True)
+    def test_buffer_is_admin_only(self):
+        """Буфер видят только сотрудники."""
+        client = Client()
+        client.get(self.url)
+        response = client.get(reverse('profiling'))
+        self.assertRedirects(
+            response, '/admin/login/?next=' + reverse('profiling')
+        )
+        client.force_login(self.admin)
+        response = client.get(reverse('profiling'))
+        self.assertContains(response, self.url)
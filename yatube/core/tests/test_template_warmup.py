@@ -0,0 +1,45 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.template import engines
+from django.test import SimpleTestCase, override_settings
+
+from core.template_warmup import template_names
+
+BROKEN_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+BROKEN_TEMPLATES = [dict(
+    settings.TEMPLATES[0], DIRS=[BROKEN_DIR, settings.TEMPLATES_DIR]
+)]
+
+
+class WarmTemplatesTests(SimpleTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(BROKEN_DIR, ignore_errors=True)
+
+    def test_finds_project_and_app_templates(self):
+        """Обходятся и каталог проекта, и каталоги приложений."""
+        names = set(template_names(engines['django'].engine))
+        self.assertIn('posts/includes/post_card.html', names)
+        self.assertIn('admin/base.html', names)
+
+    def test_all_templates_compile(self):
+        """Все шаблоны проекта компилируются."""
+        out = StringIO()
+        call_command('warm_templates', stdout=out)
+        self.assertIn('Шаблонов разобрано', out.getvalue())
+
+    @override_settings(TEMPLATES=BROKEN_TEMPLATES)
+    def test_broken_template_fails_command(self):
+        """Шаблон с ошибкой роняет команду с его именем."""
+        with open(os.path.join(BROKEN_DIR, 'broken.html'), 'w') as broken:
+            broken.write('{% if %}')
+        err = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('warm_templates', stdout=StringIO(), stderr=err)
+        self.assertIn('broken.html', err.getvalue())
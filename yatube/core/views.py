@@ -1,6 +1,10 @@
 from http import HTTPStatus
+
+from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render
 
+from .profiling import RECENT
+
 
 def page_not_found(request, exception):
     return render(
@@ -30,3 +34,12 @@ def server_error(request):
         {'path': request.path},
         status=HTTPStatus.INTERNAL_SERVER_ERROR
     )
+
+
+@staff_member_required
+def profiling(request):
+    return render(
+        request,
+        'core/profiling.html',
+        {'requests': list(reversed(RECENT))},
+    )
@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Comment, Group, Post
 
 
@@ -17,6 +18,15 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по индексу posts.search вместо LIKE по всей таблице."""
+        if not search_term:
+            return super().get_search_results(
+                request, queryset, search_term
+            )
+        rows, _ = search.ranked(search_term, limit=search.ADMIN_RESULTS)
+        return queryset.filter(pk__in=[pk for _, pk in rows]), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
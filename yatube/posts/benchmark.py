@@ -0,0 +1,241 @@
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from faker import Faker
+from mixer.backend.django import mixer
+from PIL import Image
+
+from . import feeds, thumbnails
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+BATCH_SIZE = 500
+# Доли запросов в смеси; add_comment — единственная запись
+MIX = (
+    ('index', 35),
+    ('group_posts', 15),
+    ('profile', 15),
+    ('post_detail', 20),
+    ('follow_index', 10),
+    ('add_comment', 5),
+)
+LOGIN_REQUIRED = ('follow_index', 'add_comment')
+LOGGED_IN_CLIENTS = 20
+LOGGED_IN_SHARE = 0.5
+PERCENTILES = (50, 95, 99)
+QUERY_TOLERANCE = 1.5
+# Свой кэш в памяти: cache.clear() и миниатюры тестовых картинок
+# не должны задевать кэш, которым пользуется сайт
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'benchmark',
+    },
+}
+
+
+def seed(rng, users, groups, posts, comments, follows, images):
+    """Наполняет базу синтетическими данными заданного объёма.
+
+    Пользователей и группы создаёт mixer, тексты — Faker. Посты и
+    комментарии пишутся пачками через bulk_create, поэтому сигналы
+    не срабатывают: денормализованные счётчики и ленты подписок
+    досчитываются теми же командами, что чинят их в проде.
+    """
+    fake = Faker('ru_RU')
+    fake.seed_instance(rng.random())
+    mixer.cycle(users).blend(
+        User, username=mixer.sequence('bench_user_{0}')
+    )
+    mixer.cycle(groups).blend(Group, slug=mixer.sequence('bench-group-{0}'))
+    user_ids = list(User.objects.values_list('pk', flat=True))
+    group_ids = list(Group.objects.values_list('pk', flat=True)) + [None]
+    image_names = _make_images(rng, images)
+    for start in range(0, posts, BATCH_SIZE):
+        Post.objects.bulk_create([
+            Post(
+                author_id=rng.choice(user_ids),
+                group_id=rng.choice(group_ids),
+                text=fake.paragraph(nb_sentences=5),
+                image=image_names[number] if number < images else '',
+            )
+            for number in range(start, min(start + BATCH_SIZE, posts))
+        ])
+    _spread_pub_dates()
+    post_ids = list(Post.objects.values_list('pk', flat=True))
+    for start in range(0, comments, BATCH_SIZE):
+        Comment.objects.bulk_create([
+            Comment(
+                post_id=rng.choice(post_ids),
+                author_id=rng.choice(user_ids),
+                text=fake.sentence(),
+            )
+            for _ in range(start, min(start + BATCH_SIZE, comments))
+        ])
+    Follow.objects.bulk_create([
+        Follow(user_id=user_id, author_id=author_id)
+        for user_id, author_id in (
+            rng.sample(user_ids, 2) for _ in range(follows)
+        )
+    ], ignore_conflicts=True)
+    for user_id, author_id in Follow.objects.values_list('user', 'author'):
+        feeds.backfill(user_id, author_id)
+    with open(os.devnull, 'w') as quiet:
+        call_command('reconcile_post_counts', stdout=quiet)
+        call_command('backfill_comment_stats', stdout=quiet)
+    for post_id, name in Post.objects.exclude(image='').values_list(
+        'pk', 'image'
+    ):
+        thumbnails.render(name, post_id)
+
+
+def _make_images(rng, count):
+    names = []
+    for number in range(count):
+        name = f'posts/bench_{number}.jpg'
+        path = os.path.join(settings.MEDIA_ROOT, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        Image.new('RGB', (1280, 720), color).save(path, 'JPEG')
+        names.append(name)
+    return names
+
+
+def _spread_pub_dates():
+    """bulk_create ставит всем постам одно время; разносим их."""
+    now = timezone.now()
+    batch = []
+    for number, post in enumerate(Post.objects.order_by('pk').only('pk')):
+        post.pub_date = now - timedelta(minutes=number * 17)
+        batch.append(post)
+        if len(batch) == BATCH_SIZE:
+            Post.objects.bulk_update(batch, ['pub_date'])
+            batch = []
+    Post.objects.bulk_update(batch, ['pub_date'])
+
+
+class Replay:
+    """Проигрывает смесь запросов через тестовый клиент Django."""
+
+    def __init__(self, rng):
+        self.rng = rng
+        users = list(User.objects.order_by('pk'))
+        self.users = rng.sample(users, min(LOGGED_IN_CLIENTS, len(users)))
+        self.clients = []
+        for user in self.users:
+            client = Client()
+            client.force_login(user)
+            self.clients.append(client)
+        self.guest = Client()
+        self.group_slugs = list(Group.objects.values_list('slug', flat=True))
+        self.post_ids = list(Post.objects.values_list('pk', flat=True))
+
+    def request(self, name):
+        rng = self.rng
+        if name in LOGIN_REQUIRED or rng.random() < LOGGED_IN_SHARE:
+            client = rng.choice(self.clients)
+        else:
+            client = self.guest
+        if name == 'index':
+            return client.get(reverse('posts:index'))
+        if name == 'group_posts':
+            slug = rng.choice(self.group_slugs)
+            return client.get(reverse('posts:group_list', args=[slug]))
+        if name == 'profile':
+            username = rng.choice(self.users).username
+            return client.get(reverse('posts:profile', args=[username]))
+        if name == 'post_detail':
+            post_id = rng.choice(self.post_ids)
+            return client.get(reverse('posts:post_detail', args=[post_id]))
+        if name == 'follow_index':
+            return client.get(reverse('posts:follow_index'))
+        post_id = rng.choice(self.post_ids)
+        return client.post(
+            reverse('posts:add_comment', args=[post_id]),
+            {'text': 'Комментарий из нагрузочного теста'},
+        )
+
+    def run(self, count):
+        names = [name for name, _ in MIX]
+        weights = [weight for _, weight in MIX]
+        samples = {name: [] for name in names}
+        errors = 0
+        cache.clear()
+        started = time.perf_counter()
+        for name in self.rng.choices(names, weights, k=count):
+            with CaptureQueriesContext(connection) as queries:
+                request_started = time.perf_counter()
+                response = self.request(name)
+                elapsed = time.perf_counter() - request_started
+            if response.status_code >= 400:
+                errors += 1
+            samples[name].append((elapsed * 1000, len(queries)))
+        return summarize(samples, time.perf_counter() - started, errors)
+
+
+def percentile(values, percent):
+    """Процентиль по методу ближайшего ранга."""
+    ordered = sorted(values)
+    rank = max(1, -(-percent * len(ordered) // 100))
+    return ordered[rank - 1]
+
+
+def summarize(samples, elapsed, errors):
+    endpoints = {}
+    for name, values in samples.items():
+        if not values:
+            continue
+        latencies = [latency for latency, _ in values]
+        queries = [count for _, count in values]
+        endpoints[name] = {
+            'requests': len(values),
+            **{
+                f'p{percent}': percentile(latencies, percent)
+                for percent in PERCENTILES
+            },
+            'queries': sum(queries) / len(queries),
+            'max_queries': max(queries),
+        }
+    total = sum(len(values) for values in samples.values())
+    return {
+        'requests': total,
+        'errors': errors,
+        'throughput': total / elapsed if elapsed else 0,
+        'endpoints': endpoints,
+    }
+
+
+def compare(results, baseline, tolerance):
+    """Регрессии относительно базовой линии: p95 и число запросов к БД.
+
+    Время сравнивается с допуском tolerance (доля). Среднее число
+    запросов к БД от железа не зависит, поэтому его допуск QUERY_TOLERANCE
+    покрывает только перестроение кэша главной в другой момент.
+    """
+    regressions = []
+    for name, current in results['endpoints'].items():
+        base = baseline['endpoints'].get(name)
+        if base is None:
+            continue
+        if current['p95'] > base['p95'] * (1 + tolerance):
+            regressions.append(
+                f'{name}: p95 {current["p95"]:.1f} мс '
+                f'вместо {base["p95"]:.1f} мс'
+            )
+        if current['queries'] > base['queries'] + QUERY_TOLERANCE:
+            regressions.append(
+                f'{name}: {current["queries"]:.1f} запросов к БД '
+                f'вместо {base["queries"]:.1f}'
+            )
+    return regressions
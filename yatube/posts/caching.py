@@ -0,0 +1,248 @@
+import hashlib
+import math
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from functools import wraps
+
+from django.core.cache import cache
+from django.utils.cache import (get_cache_key, get_max_age, has_vary_header,
+                                learn_cache_key, patch_response_headers)
+
+INDEX_GENERATION_KEY = 'index_page:generation'
+# Сколько держим блокировку на перестроение и сколько ждём чужую
+REBUILD_LOCK_TIME = 10
+REBUILD_WAIT_TIME = 2
+REBUILD_POLL_INTERVAL = 0.05
+# Сколько ещё можно отдавать просроченную страницу, пока её обновляют
+STALE_TIME = 60 * 10
+# Коэффициент раннего обновления (XFetch): больше — обновляем раньше
+EARLY_EXPIRATION_BETA = 1.0
+
+HIT = 'hit'
+MISS = 'miss'
+STALE = 'stale'
+REGENERATE = 'regenerate'
+METRICS = (HIT, MISS, STALE, REGENERATE)
+# Счётчики копятся в процессе и уходят в кэш пачкой: раз в столько
+# событий или секунд, смотря что наступит раньше
+METRICS_FLUSH_SIZE = 100
+METRICS_FLUSH_INTERVAL = 10
+
+_metrics = Counter()
+_metrics_lock = threading.Lock()
+_metrics_flushed_at = time.monotonic()
+
+
+def _modified_key(key):
+    return f'{key}.modified'
+
+
+def get_generation(key):
+    """Текущее поколение кэша; стартует со времени, а не с единицы.
+
+    Ключ хранится без срока: иначе он истекал бы по TIMEOUT кэша,
+    и все страницы разом уходили бы в промах. Если его всё же
+    вытеснят, новое значение не совпадёт со старыми страницами,
+    и они не всплывут снова.
+    """
+    generation = cache.get(key)
+    if generation is None:
+        if cache.add(key, int(time.time()), None):
+            cache.set(_modified_key(key), time.time(), None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, int(time.time()), None)
+    cache.set(_modified_key(key), time.time(), None)
+
+
+def generation_modified(key):
+    """Когда поколение последний раз менялось, или None, если неизвестно."""
+    modified = cache.get(_modified_key(key))
+    if modified is None:
+        return None
+    return datetime.fromtimestamp(modified, timezone.utc)
+
+
+def request_etag(request, *parts):
+    """ETag из пользователя, адреса страницы и версий её данных."""
+    raw = '|'.join(str(part) for part in (
+        request.user.pk, request.get_full_path(), *parts,
+    ))
+    return hashlib.md5(raw.encode()).hexdigest()
+
+
+def page_etag(request, generation_key, *parts):
+    """ETag страницы без её рендеринга.
+
+    Складывается из поколения кэша, пользователя и адреса страницы:
+    всё, что меняет ленты и посты, уже увеличивает поколение.
+    """
+    return request_etag(request, get_generation(generation_key), *parts)
+
+
+def _metric_key(key_prefix, name):
+    return f'{key_prefix}.metrics.{name}'
+
+
+def record(key_prefix, name):
+    """Считает событие в памяти процесса, без записи в кэш на каждый hit."""
+    with _metrics_lock:
+        _metrics[_metric_key(key_prefix, name)] += 1
+        due = (
+            sum(_metrics.values()) >= METRICS_FLUSH_SIZE
+            or time.monotonic() - _metrics_flushed_at >= METRICS_FLUSH_INTERVAL
+        )
+    if due:
+        flush_metrics()
+
+
+def flush_metrics():
+    """Переносит накопленные счётчики в кэш, по incr на метрику."""
+    global _metrics_flushed_at
+    with _metrics_lock:
+        pending = dict(_metrics)
+        _metrics.clear()
+        _metrics_flushed_at = time.monotonic()
+    for key, count in pending.items():
+        if not cache.add(key, count, None):
+            try:
+                cache.incr(key, count)
+            except ValueError:
+                cache.add(key, count, None)
+
+
+def cache_metrics(key_prefix):
+    """Счётчики hit/miss/stale/regenerate для страниц с этим префиксом.
+
+    Накопленное в этом процессе сначала сбрасывается в кэш; счётчики
+    других процессов видны с задержкой до METRICS_FLUSH_INTERVAL.
+    """
+    flush_metrics()
+    values = cache.get_many(
+        [_metric_key(key_prefix, name) for name in METRICS]
+    )
+    return {
+        name: values.get(_metric_key(key_prefix, name), 0)
+        for name in METRICS
+    }
+
+
+def _should_store(request, response):
+    if response.streaming or response.status_code != 200:
+        return False
+    if (
+        not request.COOKIES and response.cookies
+        and has_vary_header(response, 'Cookie')
+    ):
+        return False
+    return 'private' not in response.get('Cache-Control', ())
+
+
+def _store(request, response, timeout, key_prefix, delta):
+    max_age = get_max_age(response)
+    if max_age is not None:
+        timeout = max_age
+    patch_response_headers(response, timeout)
+    if timeout:
+        # Список заголовков живёт столько же, сколько запись: иначе
+        # просроченную страницу не найти и отдавать её, пока она
+        # перестраивается, было бы нечем
+        cache_key = learn_cache_key(
+            request, response, timeout + STALE_TIME, key_prefix, cache=cache
+        )
+        entry = (response, time.time() + timeout, delta)
+        cache.set(cache_key, entry, timeout + STALE_TIME)
+
+
+def _lookup(request, key_prefix):
+    cache_key = get_cache_key(request, key_prefix, 'GET', cache=cache)
+    return cache.get(cache_key) if cache_key else None
+
+
+def _expired(expires_at, delta):
+    """Просрочена ли запись, с вероятностным ранним обновлением.
+
+    Чем дороже была генерация (delta) и чем ближе срок, тем вероятнее
+    один из запросов обновит страницу заранее, а не все разом в срок.
+    """
+    early = delta * EARLY_EXPIRATION_BETA * -math.log(1 - random.random())
+    return time.time() + early >= expires_at
+
+
+def _wait_for_rebuild(request, key_prefix):
+    deadline = time.monotonic() + REBUILD_WAIT_TIME
+    while time.monotonic() < deadline:
+        time.sleep(REBUILD_POLL_INTERVAL)
+        entry = _lookup(request, key_prefix)
+        if entry is not None:
+            return entry[0]
+    return None
+
+
+def _from_cache(request, key_prefix, prefix, lock_key):
+    """Возвращает ответ из кэша (или None) и взята ли блокировка."""
+    entry = _lookup(request, prefix)
+    if entry is None:
+        record(key_prefix, MISS)
+        if cache.add(lock_key, True, REBUILD_LOCK_TIME):
+            return None, True
+        return _wait_for_rebuild(request, prefix), False
+    response, expires_at, delta = entry
+    if not _expired(expires_at, delta):
+        record(key_prefix, HIT)
+        return response, False
+    if cache.add(lock_key, True, REBUILD_LOCK_TIME):
+        return None, True
+    record(key_prefix, STALE)
+    return response, False
+
+
+def single_flight_cache_page(timeout, key_prefix, generation_key=None):
+    """Замена cache_page, которая не допускает давки за кэшем.
+
+    Просроченную страницу перестраивает один воркер, взявший
+    блокировку, а остальные тем временем отдают старую копию
+    (stale-while-revalidate). Холодную страницу остальные ждут.
+    Срок жизни записи вероятностно сокращается (XFetch), чтобы
+    обновления не совпадали по времени.
+
+    Если задан generation_key, его значение входит в ключ кэша.
+    Поколение увеличивают сигналы (см. posts.signals), поэтому
+    страницу можно держать в кэше долго.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return view(request, *args, **kwargs)
+            prefix = key_prefix
+            if generation_key is not None:
+                prefix = f'{key_prefix}.{get_generation(generation_key)}'
+            lock_key = f'{prefix}.lock.{request.get_full_path()}'
+            response, locked = _from_cache(
+                request, key_prefix, prefix, lock_key
+            )
+            if response is not None:
+                return response
+            try:
+                started = time.monotonic()
+                response = view(request, *args, **kwargs)
+                record(key_prefix, REGENERATE)
+                if _should_store(request, response):
+                    delta = time.monotonic() - started
+                    _store(request, response, timeout, prefix, delta)
+            finally:
+                if locked:
+                    cache.delete(lock_key)
+            return response
+        return wrapper
+    return decorator
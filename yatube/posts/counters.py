@@ -0,0 +1,149 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Max, OuterRef, Subquery
+from django.utils import timezone
+
+from .models import AuthorStats, Comment, Post
+
+# Сигналы сдвигают счётчик только в кэше своего процесса: с LocMemCache
+# остальные воркеры досчитывают его заново раз в минуту
+COUNTER_TIMEOUT = 60 * 60 * 24 if settings.CACHE_SHARED else 60
+# Сколько живёт блокировка, под которой счётчик считается точно
+SEED_LOCK_TIMEOUT = 60
+GLOBAL = 'all'
+GROUP = 'group'
+
+
+def counter_key(scope, pk=None):
+    return f'post_count:{scope}:{pk}'
+
+
+def bump(scope, pk, delta):
+    """Сдвигает прогретый счётчик; холодный оставляем холодным."""
+    if scope != GLOBAL and pk is None:
+        return
+    try:
+        cache.incr(counter_key(scope, pk), delta)
+    except ValueError:
+        pass
+
+
+def _seed_lock_key(key):
+    return f'{key}:seed'
+
+
+def forget(scope, pk):
+    cache.delete(counter_key(scope, pk))
+
+
+class PostCounter:
+    """Кэшированное число постов в ленте: вся лента или группа.
+
+    Счётчик поддерживается сигналами в posts.signals. Холодный счётчик
+    засевает точным COUNT(*) один запрос, взявший блокировку; остальные,
+    пока он считает, получают оценку, которая в кэш не попадает:
+    для общей ленты это MAX(id) из первичного ключа без обхода таблицы,
+    для группы — подсчёт по индексу внешнего ключа. Число постов автора
+    хранится в AuthorStats, см. author_post_count.
+    """
+
+    def __init__(self, posts, scope=GLOBAL, pk=None):
+        self.posts = posts
+        self.key = counter_key(scope, pk)
+        self.scope = scope
+
+    def __call__(self):
+        value = cache.get(self.key)
+        if value is None:
+            value = self.seed()
+        return max(value, 0)
+
+    def seed(self):
+        lock_key = _seed_lock_key(self.key)
+        if not cache.add(lock_key, True, SEED_LOCK_TIMEOUT):
+            return self.estimate()
+        try:
+            value = self.posts.order_by().count()
+            cache.add(self.key, value, COUNTER_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    def estimate(self):
+        if self.scope == GLOBAL:
+            return self.posts.aggregate(last=Max('pk'))['last'] or 0
+        return self.posts.order_by().count()
+
+
+def change_author_post_count(author_id, delta):
+    """Атомарно сдвигает счётчик постов автора, если он уже заведён."""
+    AuthorStats.objects.filter(
+        author_id=author_id, post_count__gte=-delta
+    ).update(
+        post_count=F('post_count') + delta,
+        version=F('version') + 1,
+        modified=timezone.now(),
+    )
+
+
+def touch_authors(author_ids=None):
+    """Одним UPDATE сдвигает версию страниц авторов (без ids — всех).
+
+    author_ids может быть и подзапросом, например
+    posts.values('author').
+    """
+    stats = AuthorStats.objects.all()
+    if author_ids is not None:
+        stats = stats.filter(author_id__in=author_ids)
+    stats.update(version=F('version') + 1, modified=timezone.now())
+
+
+def author_stats(author):
+    """Строка AuthorStats автора; заводится при первом обращении.
+
+    Чтобы обойтись без отдельного запроса, выбирайте автора вместе
+    с select_related('stats') или select_related('author__stats').
+    """
+    try:
+        return author.stats
+    except AuthorStats.DoesNotExist:
+        stats, _ = AuthorStats.objects.get_or_create(
+            author=author,
+            defaults={'post_count': author.posts.count()},
+        )
+        return stats
+
+
+def author_post_count(author):
+    """Число постов автора без обхода таблицы постов."""
+    return author_stats(author).post_count
+
+
+def comment_added(comment):
+    """Одним UPDATE сдвигает счётчик комментариев и время активности.
+
+    Вторым UPDATE сдвигается версия страницы автора поста.
+    """
+    posts = Post.objects.filter(pk=comment.post_id)
+    posts.update(
+        comment_count=F('comment_count') + 1,
+        last_commented_at=comment.created,
+        card_version=F('card_version') + 1,
+    )
+    touch_authors(posts.values('author'))
+
+
+def comment_removed(comment):
+    """Одним UPDATE уменьшает счётчик и откатывает время активности.
+
+    Время предыдущего комментария берётся по индексу (post, created);
+    версия страницы автора сдвигается, как в comment_added.
+    """
+    latest = Comment.objects.filter(post=OuterRef('pk')).order_by('-created')
+    posts = Post.objects.filter(pk=comment.post_id)
+    posts.filter(comment_count__gt=0).update(
+        comment_count=F('comment_count') - 1,
+        last_commented_at=Subquery(latest.values('created')[:1]),
+        card_version=F('card_version') + 1,
+    )
+    touch_authors(posts.values('author'))
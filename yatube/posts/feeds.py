@@ -0,0 +1,177 @@
+import random
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import Celebrity, FeedEntry, Follow, Post
+
+# Сколько последних постов держим в ленте одного читателя
+FEED_LENGTH = 1000
+# Авторам с большим числом подписчиков ленты не рассылаем:
+# их посты подмешиваются при чтении (fan-out-on-read)
+FANOUT_LIMIT = 5000
+CELEBRITIES_KEY = 'feed:celebrities'
+CELEBRITIES_TIMEOUT = 60 * 10
+# Доля читателей, чьи ленты подрезаются при рассылке очередного поста:
+# лента растёт на одну запись за пост, так что в среднем она длиннее
+# FEED_LENGTH не больше чем на 1 / TRIM_RATE записей
+TRIM_RATE = 0.01
+BATCH_SIZE = 500
+# Сколько записей лент собирается в памяти за раз при дозаполнении
+BACKFILL_CHUNK = 10000
+
+
+def celebrity_ids():
+    """Авторы, чьи посты читаются из Post напрямую, а не из лент.
+
+    Список ведёт команда refresh_celebrities (см. update_celebrities),
+    а здесь он только читается из таблицы Celebrity и кэшируется
+    на CELEBRITIES_TIMEOUT.
+    """
+    ids = cache.get(CELEBRITIES_KEY)
+    if ids is None:
+        ids = set(Celebrity.objects.values_list('author_id', flat=True))
+        cache.set(CELEBRITIES_KEY, ids, CELEBRITIES_TIMEOUT)
+    return ids
+
+
+def update_celebrities():
+    """Пересчитывает список популярных авторов по числу подписчиков.
+
+    Ленты подписчиков авторов, выбывших из списка, дозаполняются:
+    подписчиков у них теперь не больше FANOUT_LIMIT. Возвращает
+    число добавленных и выбывших авторов.
+    """
+    current = set(
+        Follow.objects.values('author')
+        .annotate(followers=Count('pk'))
+        .filter(followers__gt=FANOUT_LIMIT)
+        .values_list('author', flat=True)
+    )
+    previous = set(Celebrity.objects.values_list('author_id', flat=True))
+    with transaction.atomic():
+        Celebrity.objects.filter(author__in=previous - current).delete()
+        Celebrity.objects.bulk_create(
+            [Celebrity(author_id=pk) for pk in current - previous],
+            ignore_conflicts=True,
+        )
+    cache.delete(CELEBRITIES_KEY)
+    dropped = previous - current
+    backfill_authors(dropped)
+    return len(current - previous), len(dropped)
+
+
+def _entry(user_id, post):
+    return FeedEntry(
+        user_id=user_id,
+        post_id=post.pk,
+        author_id=post.author_id,
+        pub_date=post.pub_date,
+    )
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if post.author_id in celebrity_ids():
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    sampled = []
+    entries = []
+    for user_id in followers.iterator():
+        entries.append(_entry(user_id, post))
+        if random.random() < TRIM_RATE:
+            sampled.append(user_id)
+    FeedEntry.objects.bulk_create(entries, batch_size=BATCH_SIZE)
+    trim(sampled)
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту читателя последние посты нового автора."""
+    backfill_reader(user_id, [author_id])
+
+
+def backfill_reader(user_id, author_ids):
+    """Добавляет в ленту читателя последние посты новых авторов.
+
+    В ленте всё равно остаются только FEED_LENGTH последних постов,
+    поэтому посты всех авторов читаются одним запросом с общим LIMIT.
+    """
+    author_ids = set(author_ids) - celebrity_ids()
+    if not author_ids:
+        return
+    posts = Post.objects.filter(author_id__in=author_ids).only(
+        'pk', 'author_id', 'pub_date'
+    )[:FEED_LENGTH]
+    entries = [_entry(user_id, post) for post in posts]
+    if entries:
+        FeedEntry.objects.bulk_create(
+            entries, batch_size=BATCH_SIZE, ignore_conflicts=True
+        )
+        trim([user_id])
+
+
+def backfill_authors(author_ids):
+    """Дозаполняет ленты всех подписчиков авторов пачками INSERT.
+
+    На автора — один запрос за его последними постами и один
+    за подписчиками, без запросов на каждую подписку. Подписчики
+    берутся частями, чтобы в памяти было не больше BACKFILL_CHUNK
+    записей. Посты, которые уже есть в лентах, пропускаются.
+    """
+    author_ids = set(author_ids) - celebrity_ids()
+    for author_id in author_ids:
+        posts = list(Post.objects.filter(author_id=author_id).only(
+            'pk', 'author_id', 'pub_date'
+        )[:FEED_LENGTH])
+        followers = list(Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True))
+        if not posts or not followers:
+            continue
+        step = max(1, BACKFILL_CHUNK // len(posts))
+        for start in range(0, len(followers), step):
+            chunk = followers[start:start + step]
+            FeedEntry.objects.bulk_create(
+                [_entry(user_id, post) for user_id in chunk
+                 for post in posts],
+                batch_size=BATCH_SIZE,
+                ignore_conflicts=True,
+            )
+            trim(chunk)
+
+
+def trim(user_ids):
+    """Оставляет в лентах читателей только FEED_LENGTH последних постов."""
+    for user_id in user_ids:
+        entries = FeedEntry.objects.filter(user_id=user_id)
+        newest = entries.order_by('-pub_date').values('pk')[:FEED_LENGTH]
+        entries.exclude(pk__in=newest).delete()
+
+
+def prune(user_id, author_ids):
+    """Убирает из ленты читателя посты авторов после отписки.
+
+    author_ids может быть и подзапросом.
+    """
+    FeedEntry.objects.filter(
+        user_id=user_id, author_id__in=author_ids
+    ).delete()
+
+
+def timeline(user):
+    """Лента подписок: готовый список плюс посты популярных авторов."""
+    entries = FeedEntry.objects.filter(user=user).order_by(
+        '-pub_date'
+    ).values('post_id')[:FEED_LENGTH]
+    condition = Q(pk__in=entries)
+    celebrities = celebrity_ids()
+    if celebrities:
+        condition |= Q(
+            author__in=Follow.objects.filter(
+                user=user, author__in=celebrities
+            ).values('author_id')
+        )
+    return Post.objects.filter(condition)
@@ -0,0 +1,58 @@
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from . import feeds
+from .models import Follow, User
+
+# Сколько авторов можно передать в одном запросе к follow_bulk
+MAX_BULK_FOLLOWS = 500
+
+
+def follow(user, usernames):
+    """Подписывает user на авторов; повторная подписка ничего не меняет.
+
+    Авторы и то, подписан ли на них user, выбираются одним запросом,
+    новые подписки пишутся одним INSERT с игнорированием конфликтов
+    по unique_following, так что одновременные клики не падают
+    с IntegrityError. bulk_create не шлёт сигналов, поэтому ленты
+    новых подписок дозаполняются здесь же — в той же транзакции
+    и одним чтением постов на всех новых авторов.
+    Возвращает имена авторов, подписка на которых новая, и имена,
+    которых нет среди пользователей.
+    """
+    usernames = set(usernames)
+    authors = User.objects.filter(username__in=usernames).annotate(
+        followed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('pk'))
+        )
+    ).values_list('pk', 'username', 'followed')
+    found = set()
+    new = {}
+    for author_id, username, followed in authors:
+        found.add(username)
+        if not followed and author_id != user.pk:
+            new[author_id] = username
+    if new:
+        with transaction.atomic():
+            Follow.objects.bulk_create(
+                [Follow(user=user, author_id=author_id) for author_id in new],
+                ignore_conflicts=True,
+            )
+            feeds.backfill_reader(user.pk, new)
+    return sorted(new.values()), sorted(usernames - found)
+
+
+def unfollow(user, usernames):
+    """Отписывает user от авторов; возвращает число снятых подписок.
+
+    Подписки и записи ленты удаляются двумя DELETE по подзапросу
+    авторов. У Follow нет обработчиков удаления, поэтому Django
+    удаляет подписки сразу, без выборки строк; ленту чистим здесь же.
+    """
+    authors = User.objects.filter(username__in=usernames).values('pk')
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(
+            user=user, author__in=authors
+        ).delete()
+        feeds.prune(user.pk, authors)
+    return deleted
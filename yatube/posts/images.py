@@ -0,0 +1,74 @@
+import os
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image, ImageOps
+
+# Длинная сторона, до которой ужимается оригинал при загрузке
+MAX_SIDE = 1920
+QUALITY = 85
+# Ограничения проверяются по заголовку, до раскодирования картинки
+MAX_PIXELS = 40 * 1000 * 1000
+MAX_UPLOAD_SIZE = 20 * 1024 * 1024
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+def check_header(upload):
+    """Открывает картинку, читая только заголовок, и проверяет размеры."""
+    if upload.size > MAX_UPLOAD_SIZE:
+        raise ValidationError(
+            'Файл больше %(limit)s МБ.',
+            params={'limit': MAX_UPLOAD_SIZE // (1024 * 1024)},
+        )
+    upload.seek(0)
+    image = Image.open(upload)
+    if image.format not in EXTENSIONS:
+        raise ValidationError('Поддерживаются JPEG, PNG, GIF и WebP.')
+    width, height = image.size
+    if width * height > MAX_PIXELS:
+        raise ValidationError(
+            'Картинка больше %(limit)s мегапикселей.',
+            params={'limit': MAX_PIXELS // (1000 * 1000)},
+        )
+    return image
+
+
+def process_upload(upload):
+    """Пересохраняет загруженную картинку без метаданных.
+
+    Оригинал больше MAX_SIDE уменьшается; JPEG при этом раскодируется
+    сразу в уменьшенном масштабе (draft), так что память на загрузку
+    ограничена MAX_PIXELS, а не размером файла. Результат, как и сами
+    загрузки, уходит на диск, если больше FILE_UPLOAD_MAX_MEMORY_SIZE.
+    Возвращает файл, ширину и высоту.
+    """
+    image = check_header(upload)
+    if getattr(image, 'is_animated', False):
+        # Пересохранение убило бы анимацию, поэтому её не трогаем
+        if max(image.size) > MAX_SIDE:
+            raise ValidationError(
+                'Анимация больше %(limit)s пикселей по стороне.',
+                params={'limit': MAX_SIDE},
+            )
+        upload.seek(0)
+        return upload, image.width, image.height
+    image_format = image.format
+    image.draft(image.mode, (MAX_SIDE, MAX_SIDE))
+    image.thumbnail((MAX_SIDE, MAX_SIDE))
+    image = ImageOps.exif_transpose(image)
+    name = os.path.splitext(os.path.basename(upload.name))[0]
+    spool = SpooledTemporaryFile(settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    params = {'optimize': True}
+    if image_format in ('JPEG', 'WEBP'):
+        params['quality'] = QUALITY
+    if 'icc_profile' in image.info:
+        params['icc_profile'] = image.info['icc_profile']
+    image.save(spool, image_format, **params)
+    output = UploadedFile(
+        spool, f'{name}.{EXTENSIONS[image_format]}',
+        Image.MIME[image_format], spool.tell(),
+    )
+    output.seek(0)
+    return output, image.width, image.height
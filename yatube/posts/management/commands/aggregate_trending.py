@@ -0,0 +1,45 @@
+import json
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import trending
+
+
+class Command(BaseCommand):
+    help = (
+        'Собирает комментарии и подписки в часовые корзины ActivityBucket '
+        'и пересчитывает списки популярного в TrendingList. Запускайте по '
+        'cron раз в несколько минут: каждый запуск пересчитывает только '
+        'часы с прошлого.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--state', default=os.path.join(
+                settings.BASE_DIR, 'aggregate_trending.json'
+            ),
+            help='Файл, где хранится время прошлого запуска.',
+        )
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        self.state = options['state']
+        buckets = trending.aggregate(started, self.load_since())
+        lists = trending.refresh(started)
+        self.save_since(started)
+        self.stdout.write(f'Корзин обновлено: {buckets}, списков: {lists}')
+
+    def load_since(self):
+        try:
+            with open(self.state) as state:
+                return parse_datetime(json.load(state)['since'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save_since(self, started):
+        with open(self.state, 'w') as state:
+            json.dump({'since': started.isoformat()}, state)
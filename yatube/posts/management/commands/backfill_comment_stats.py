@@ -0,0 +1,68 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Max
+
+from posts import counters
+from posts.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает Post.comment_count и Post.last_commented_at '
+        'по таблице комментариев. Посты обходятся пачками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, сколько постов разошлось.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        fixed = 0
+        last_pk = 0
+        while True:
+            post_ids = list(
+                Post.objects.filter(pk__gt=last_pk)
+                .order_by('pk')
+                .values_list('pk', flat=True)[:batch_size]
+            )
+            if not post_ids:
+                break
+            fixed += self.backfill(post_ids, options['dry_run'])
+            last_pk = post_ids[-1]
+        verb = 'Разошлось' if options['dry_run'] else 'Исправлено'
+        self.stdout.write(f'{verb} постов: {fixed}')
+
+    def backfill(self, post_ids, dry_run):
+        with transaction.atomic():
+            actual = {
+                row['post']: (row['count'], row['last'])
+                for row in Comment.objects.filter(post_id__in=post_ids)
+                .values('post')
+                .annotate(count=Count('pk'), last=Max('created'))
+                .order_by()
+            }
+            stored = (
+                Post.objects.select_for_update()
+                .filter(pk__in=post_ids)
+                .values_list('pk', 'comment_count', 'last_commented_at')
+            )
+            changed = []
+            for post_id, *current in stored:
+                count, last = actual.get(post_id, (0, None))
+                if current != [count, last]:
+                    changed.append(Post(
+                        pk=post_id, comment_count=count, last_commented_at=last
+                    ))
+            if not dry_run and changed:
+                Post.objects.bulk_update(
+                    changed, ['comment_count', 'last_commented_at']
+                )
+                changed_ids = [post.pk for post in changed]
+                posts = Post.objects.filter(pk__in=changed_ids)
+                posts.update(card_version=F('card_version') + 1)
+                counters.touch_authors(posts.values('author'))
+        return len(changed)
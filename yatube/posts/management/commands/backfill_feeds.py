@@ -0,0 +1,30 @@
+from itertools import groupby
+from operator import itemgetter
+
+from django.core.management.base import BaseCommand
+
+from posts import feeds
+from posts.models import Follow
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет ленты подписок по уже существующим подпискам. '
+        'Нужна один раз после появления таблицы FeedEntry; повторный '
+        'запуск ничего не дублирует.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        pairs = Follow.objects.order_by('user', 'author').values_list(
+            'user', 'author'
+        ).iterator(chunk_size=options['batch_size'])
+        filled = 0
+        for user_id, follows in groupby(pairs, key=itemgetter(0)):
+            feeds.backfill_reader(
+                user_id, [author_id for _, author_id in follows]
+            )
+            filled += 1
+        self.stdout.write(f'Заполнено лент: {filled}')
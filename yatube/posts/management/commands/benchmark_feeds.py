@@ -0,0 +1,107 @@
+import json
+import random
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from posts.benchmark import (BENCHMARK_CACHES, PERCENTILES, Replay, compare,
+                             seed)
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный тест лент: наполняет отдельную тестовую базу '
+        'синтетическими данными, проигрывает смесь запросов и печатает '
+        'задержки, число запросов к БД и пропускную способность. '
+        'Результат можно сохранить как базовую линию и сравнивать с ней.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=2000)
+        parser.add_argument('--images', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--save-baseline', metavar='PATH',
+            help='Записать результат в JSON как базовую линию.',
+        )
+        parser.add_argument(
+            '--baseline', metavar='PATH',
+            help='Сравнить с базовой линией и упасть при регрессии.',
+        )
+        parser.add_argument(
+            '--tolerance', type=float, default=0.25,
+            help='Допустимый рост p95 относительно базовой линии.',
+        )
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        media_root = tempfile.mkdtemp()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True
+        )
+        try:
+            with override_settings(
+                MEDIA_ROOT=media_root, THUMBNAIL_WORKERS=0,
+                CACHES=BENCHMARK_CACHES,
+            ):
+                self.stdout.write('Наполняем базу...')
+                seed(
+                    rng, options['users'], options['groups'],
+                    options['posts'], options['comments'],
+                    options['follows'], options['images'],
+                )
+                self.stdout.write('Проигрываем запросы...')
+                results = Replay(rng).run(options['requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(media_root, ignore_errors=True)
+        results['dataset'] = {
+            name: options[name] for name in (
+                'users', 'groups', 'posts', 'comments', 'follows',
+                'images', 'requests', 'seed',
+            )
+        }
+        self.report(results)
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as baseline:
+                json.dump(results, baseline, ensure_ascii=False, indent=2)
+        if options['baseline']:
+            self.check_baseline(results, options)
+
+    def report(self, results):
+        header = f'{"endpoint":<14}{"n":>6}' + ''.join(
+            f'{f"p{percent}, мс":>11}' for percent in PERCENTILES
+        ) + f'{"SQL":>7}{"max SQL":>9}'
+        self.stdout.write(header)
+        for name, stats in results['endpoints'].items():
+            self.stdout.write(
+                f'{name:<14}{stats["requests"]:>6}' + ''.join(
+                    f'{stats[f"p{percent}"]:>11.1f}'
+                    for percent in PERCENTILES
+                ) + f'{stats["queries"]:>7.1f}{stats["max_queries"]:>9}'
+            )
+        self.stdout.write(
+            f'Запросов: {results["requests"]}, ошибок: {results["errors"]}, '
+            f'{results["throughput"]:.0f} запросов/с'
+        )
+
+    def check_baseline(self, results, options):
+        with open(options['baseline']) as baseline:
+            baseline = json.load(baseline)
+        if baseline.get('dataset') != results['dataset']:
+            self.stderr.write(
+                'Базовая линия снята на другом наборе данных, '
+                'сравнение может быть неточным.'
+            )
+        regressions = compare(results, baseline, options['tolerance'])
+        if regressions:
+            raise CommandError('Регрессии:\n' + '\n'.join(regressions))
+        self.stdout.write('Регрессий относительно базовой линии нет.')
@@ -0,0 +1,227 @@
+import json
+import os
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as thumbnail_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.models import KVStore
+
+from posts import thumbnails
+from posts.models import Post
+
+KV_PHASE = 'kv'
+FILES_PHASE = 'files'
+
+
+class Throttle:
+    """Не даёт делать больше rate файловых операций в секунду."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.next_at = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self.next_at > now:
+            time.sleep(self.next_at - now)
+        self.next_at = max(now, self.next_at) + self.interval
+
+
+def walk(root, after=()):
+    """Файлы под root в порядке имён, как кортежи частей пути.
+
+    Каталоги, целиком лежащие до after, пропускаются без обхода:
+    так прерванная чистка продолжается с того же места.
+    """
+    try:
+        entries = sorted(os.scandir(root), key=lambda entry: entry.name)
+    except FileNotFoundError:
+        return
+    for entry in entries:
+        parts = (entry.name,)
+        if entry.is_dir(follow_symlinks=False):
+            if after and parts < after[:1]:
+                continue
+            inner = after[1:] if after[:1] == parts else ()
+            for path in walk(entry.path, inner):
+                yield parts + path
+        elif parts > after[:1] or not after:
+            yield parts
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет миниатюры sorl-thumbnail, которые больше не нужны: '
+        'записи KV-хранилища для картинок, не принадлежащих ни одному '
+        'посту, и файлы в media/cache без записи в хранилище. '
+        'Прерванный запуск продолжается с места остановки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--rate', type=float, default=200,
+            help='Не больше стольких файловых операций в секунду; 0 — '
+                 'без ограничения.',
+        )
+        parser.add_argument(
+            '--min-age', type=int, default=60 * 60,
+            help='Не трогать файлы моложе стольких секунд: их запись '
+                 'в хранилище может ещё не появиться.',
+        )
+        parser.add_argument(
+            '--state', default=os.path.join(
+                settings.BASE_DIR, 'clean_thumbnails.json'
+            ),
+            help='Файл, где хранится место остановки.',
+        )
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать сначала, не глядя на сохранённое место.',
+        )
+        parser.add_argument(
+            '--loop', type=int, default=0, metavar='SECONDS',
+            help='Повторять чистку с такой паузой, не завершаясь.',
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать, сколько места освободится.',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.throttle = Throttle(options['rate'])
+        while True:
+            self.removed = 0
+            self.reclaimed = 0
+            self.clean()
+            verb = 'Можно удалить' if options['dry_run'] else 'Удалено'
+            self.stdout.write(
+                f'{verb} миниатюр: {self.removed}, '
+                f'освобождено: {filesizeformat(self.reclaimed)}'
+            )
+            if not options['loop']:
+                return
+            time.sleep(options['loop'])
+
+    def clean(self):
+        # Пробный запуск считает всё с начала и чужое место остановки
+        # не трогает: настоящая чистка продолжится с него же
+        dry_run = self.options['dry_run']
+        restart = self.options['restart'] or dry_run
+        state = {} if restart else self.load_state()
+        if state.get('phase', KV_PHASE) == KV_PHASE:
+            self.clean_kvstore(state.get('position', ''))
+            state = {}
+        self.clean_files(tuple(state.get('position', ())))
+        if not dry_run and os.path.exists(self.options['state']):
+            os.remove(self.options['state'])
+
+    def load_state(self):
+        try:
+            with open(self.options['state']) as state:
+                return json.load(state)
+        except (OSError, ValueError):
+            return {}
+
+    def save_state(self, phase, position):
+        if self.options['dry_run']:
+            return
+        with open(self.options['state'], 'w') as state:
+            json.dump({'phase': phase, 'position': position}, state)
+
+    def clean_kvstore(self, position):
+        """Забывает картинки, которых нет ни у одного поста.
+
+        Записи читаются из таблицы cached_db-хранилища пачками
+        по возрастанию ключа, а не одним списком.
+        """
+        prefix = add_prefix('', identity='image')
+        while True:
+            rows = list(
+                KVStore.objects.filter(
+                    key__startswith=prefix, key__gt=position
+                ).order_by('key').values_list('key', 'value')
+                [:self.options['batch_size']]
+            )
+            if not rows:
+                return
+            sources = [
+                image_file for image_file in (
+                    deserialize_image_file(value) for _, value in rows
+                )
+                if not image_file.name.startswith(
+                    thumbnail_settings.THUMBNAIL_PREFIX
+                )
+            ]
+            used = set(Post.objects.filter(
+                image__in=[source.name for source in sources]
+            ).values_list('image', flat=True))
+            for source in sources:
+                if source.name not in used:
+                    self.drop_source(source)
+            position = rows[-1][0]
+            self.save_state(KV_PHASE, position)
+
+    def drop_source(self, source):
+        kvstore = default.kvstore
+        for key in kvstore._get(source.key, identity='thumbnails') or []:
+            thumbnail = kvstore._get(key)
+            if thumbnail is None:
+                continue
+            self.throttle.wait()
+            if thumbnail.exists():
+                self.reclaim(thumbnail.name)
+            if not self.options['dry_run']:
+                kvstore.delete(thumbnail, delete_thumbnails=False)
+        if not self.options['dry_run']:
+            kvstore.delete(source)
+            thumbnails.forget(source.name)
+
+    def clean_files(self, position):
+        """Удаляет файлы в media/cache, о которых хранилище не знает."""
+        prefix = thumbnail_settings.THUMBNAIL_PREFIX
+        root = default.storage.path(prefix)
+        deadline = time.time() - self.options['min_age']
+        batch = []
+        for parts in walk(root, position):
+            batch.append(parts)
+            if len(batch) == self.options['batch_size']:
+                self.clean_batch(prefix, batch, deadline)
+                batch = []
+        if batch:
+            self.clean_batch(prefix, batch, deadline)
+
+    def clean_batch(self, prefix, batch, deadline):
+        names = [prefix + '/'.join(parts) for parts in batch]
+        keys = {
+            add_prefix(ImageFile(name, default.storage).key): name
+            for name in names
+        }
+        known = set(KVStore.objects.filter(
+            key__in=list(keys)
+        ).values_list('key', flat=True))
+        for key, name in keys.items():
+            if key in known:
+                continue
+            self.throttle.wait()
+            try:
+                if os.stat(default.storage.path(name)).st_mtime > deadline:
+                    continue
+            except FileNotFoundError:
+                continue
+            self.reclaim(name)
+        self.save_state(FILES_PHASE, list(batch[-1]))
+
+    def reclaim(self, name):
+        self.removed += 1
+        self.reclaimed += default.storage.size(name)
+        if not self.options['dry_run']:
+            default.storage.delete(name)
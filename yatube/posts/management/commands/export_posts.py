@@ -0,0 +1,58 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает пользователей, группы, посты, комментарии и подписки '
+        'в NDJSON или CSV. Таблицы читаются курсором, память не растёт '
+        'с их размером. Картинки выгружаются ссылкой на файл в MEDIA.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Куда писать; по умолчанию — stdout.',
+        )
+        parser.add_argument(
+            '--format', choices=('ndjson', 'csv'),
+            help='По умолчанию — по расширению файла, иначе NDJSON.',
+        )
+        parser.add_argument(
+            '--kind', action='append', choices=transfer.KINDS,
+            help='Что выгружать; можно повторить. По умолчанию — всё. '
+                 'В CSV — ровно один вид записей.',
+        )
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        data_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'ndjson'
+        )
+        kinds = [
+            kind for kind in transfer.KINDS
+            if kind in (options['kind'] or transfer.KINDS)
+        ]
+        if data_format == 'csv' and len(kinds) != 1:
+            raise CommandError('Для CSV укажите один --kind.')
+        if path == '-':
+            self.export(sys.stdout, data_format, kinds, options)
+            return
+        with open(path, 'w', encoding='utf-8', newline='') as stream:
+            self.export(stream, data_format, kinds, options)
+
+    def export(self, stream, data_format, kinds, options):
+        if data_format == 'csv':
+            writer = transfer.CSVWriter(stream, kinds[0])
+        else:
+            writer = transfer.NDJSONWriter(stream)
+        for kind in kinds:
+            exported = 0
+            for row in transfer.export_rows(kind, options['chunk_size']):
+                writer.write(kind, row)
+                exported += 1
+            self.stderr.write(f'{kind}: {exported}')
@@ -0,0 +1,91 @@
+import os
+import sys
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection
+
+from posts import counters, feeds, search, transfer
+from posts.caching import INDEX_GENERATION_KEY, bump_generation
+from posts.models import Comment, Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает записи, выгруженные export_posts, пачками bulk_create. '
+        'Файл читается потоком; уже существующие строки пропускаются, '
+        'так что прерванный импорт можно повторить. Сигналы при этом не '
+        'срабатывают, поэтому счётчики и поисковый индекс пересчитываются '
+        'в конце.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Откуда читать; по умолчанию — stdin.',
+        )
+        parser.add_argument(
+            '--format', choices=('ndjson', 'csv'),
+            help='По умолчанию — по расширению файла, иначе NDJSON.',
+        )
+        parser.add_argument(
+            '--kind', choices=transfer.KINDS,
+            help='Вид записей в CSV-файле.',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        path = options['path']
+        data_format = options['format'] or (
+            'csv' if path.endswith('.csv') else 'ndjson'
+        )
+        if data_format == 'csv' and not options['kind']:
+            raise CommandError('Для CSV укажите --kind.')
+        importer = transfer.Importer(options['batch_size'])
+        if path == '-':
+            self.load(sys.stdin, data_format, importer, options)
+        else:
+            with open(path, encoding='utf-8', newline='') as stream:
+                self.load(stream, data_format, importer, options)
+        self.finish(importer)
+        for kind, count in importer.imported.items():
+            if count:
+                self.stdout.write(f'{kind}: {count}')
+        if importer.skipped:
+            self.stdout.write(f'Пропущено записей: {importer.skipped}')
+
+    def load(self, stream, data_format, importer, options):
+        if data_format == 'csv':
+            records = transfer.read_csv(stream, options['kind'])
+        else:
+            records = transfer.read_ndjson(stream)
+        try:
+            with transfer.preserve_timestamps():
+                for kind, row in records:
+                    importer.add(kind, row)
+                importer.flush()
+        except (KeyError, ValueError) as error:
+            raise CommandError(f'Не удалось загрузить запись: {error}')
+
+    def finish(self, importer):
+        """Досчитывает то, что при поштучном создании делают сигналы."""
+        # Посты и комментарии пришли со своими id
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                no_style(), [Post, Comment]
+            ):
+                cursor.execute(sql)
+        with open(os.devnull, 'w') as quiet:
+            call_command('reconcile_post_counts', stdout=quiet)
+            call_command('backfill_comment_stats', stdout=quiet)
+            if not search.uses_fts():
+                call_command('rebuild_search_index', stdout=quiet)
+        # И новые подписки, и новые посты старых подписок
+        feeds.backfill_authors(importer.author_ids)
+        # Комментарии могли прийти к постам любых авторов
+        counters.touch_authors()
+        counters.forget(counters.GLOBAL, None)
+        for group_id in importer.group_ids:
+            counters.forget(counters.GROUP, group_id)
+        bump_generation(INDEX_GENERATION_KEY)
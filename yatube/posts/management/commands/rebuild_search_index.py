@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts import search
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        'Перестраивает поисковый индекс постов: таблицу FTS5 на SQLite '
+        'или записи PostTerm на остальных базах. Нужен после загрузки '
+        'постов в обход моделей.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if search.uses_fts():
+            with connection.cursor() as cursor:
+                search.rebuild_fts(cursor)
+            self.stdout.write('Индекс FTS5 перестроен')
+            return
+        indexed = 0
+        posts = Post.objects.order_by('pk').values_list('pk', 'text')
+        last_pk = 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:options['batch_size']])
+            if not batch:
+                break
+            with transaction.atomic():
+                for post_id, text in batch:
+                    search.index_post(post_id, text)
+            indexed += len(batch)
+            last_pk = batch[-1][0]
+        self.stdout.write(f'Проиндексировано постов: {indexed}')
@@ -0,0 +1,95 @@
+import json
+import os
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts.suggestions import Recommender, popular_authors
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рекомендации «на кого подписаться» по совместным '
+        'подпискам и общим группам. С --incremental пересчитывает только '
+        'читателей, которые подписались на кого-то или зарегистрировались '
+        'после прошлого запуска.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--incremental', action='store_true',
+            help='Только читатели, изменившиеся с прошлого запуска; '
+                 'без сохранённого запуска — все.',
+        )
+        parser.add_argument(
+            '--state', default=os.path.join(
+                settings.BASE_DIR, 'recommend_follows.json'
+            ),
+            help='Файл, где хранятся время прошлого запуска и '
+                 'популярные авторы для --incremental.',
+        )
+
+    def handle(self, *args, **options):
+        started = timezone.now()
+        self.state = options['state']
+        state = self.load_state() if options['incremental'] else {}
+        since = self.since(state)
+        users = User.objects.order_by('pk')
+        if since is None:
+            recommender = Recommender()
+            popular = recommender.popular
+        else:
+            # Только окрестность изменившихся читателей, пачка за пачкой
+            users = users.filter(
+                Q(follower__created__gte=since) | Q(date_joined__gte=since)
+            ).distinct()
+            recommender = None
+            popular = state.get('popular') or popular_authors()
+        readers = stored = 0
+        batch = []
+        for user_id in users.values_list('pk', flat=True).iterator():
+            batch.append(user_id)
+            if len(batch) == options['batch_size']:
+                stored += self.store(recommender, batch, popular)
+                readers += len(batch)
+                batch = []
+        if batch:
+            stored += self.store(recommender, batch, popular)
+            readers += len(batch)
+        self.save_state(started, popular)
+        self.stdout.write(
+            f'Читателей: {readers}, рекомендаций: {stored}'
+        )
+
+    def store(self, recommender, batch, popular):
+        if recommender is None:
+            recommender = Recommender(readers=batch, popular=popular)
+        return recommender.store(batch)
+
+    @staticmethod
+    def since(state):
+        try:
+            return parse_datetime(state['since'])
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def load_state(self):
+        try:
+            with open(self.state) as state:
+                state = json.load(state)
+        except (OSError, ValueError):
+            return {}
+        return state if isinstance(state, dict) else {}
+
+    def save_state(self, started, popular):
+        with open(self.state, 'w') as state:
+            json.dump(
+                {'since': started.isoformat(), 'popular': popular}, state
+            )
@@ -0,0 +1,72 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from posts.models import AuthorStats, Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет AuthorStats.post_count с таблицей постов и исправляет '
+        'расхождения. Авторы обходятся пачками.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать, сколько счётчиков разошлось.',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        author_ids = User.objects.order_by('pk').values_list('pk', flat=True)
+        fixed = 0
+        batch = []
+        for author_id in author_ids.iterator(chunk_size=batch_size):
+            batch.append(author_id)
+            if len(batch) == batch_size:
+                fixed += self.reconcile(batch, options['dry_run'])
+                batch = []
+        if batch:
+            fixed += self.reconcile(batch, options['dry_run'])
+        verb = 'Разошлось' if options['dry_run'] else 'Исправлено'
+        self.stdout.write(f'{verb} счётчиков: {fixed}')
+
+    def reconcile(self, author_ids, dry_run):
+        with transaction.atomic():
+            actual = dict(
+                Post.objects.filter(author_id__in=author_ids)
+                .values_list('author_id')
+                .annotate(Count('pk'))
+                .order_by()
+            )
+            stored = {
+                stats.author_id: stats
+                for stats in AuthorStats.objects.select_for_update()
+                .filter(author_id__in=author_ids)
+            }
+            missing = []
+            changed = []
+            for author_id in author_ids:
+                count = actual.get(author_id, 0)
+                stats = stored.get(author_id)
+                if stats is None:
+                    missing.append(
+                        AuthorStats(author_id=author_id, post_count=count)
+                    )
+                elif stats.post_count != count:
+                    stats.post_count = count
+                    stats.version += 1
+                    stats.modified = timezone.now()
+                    changed.append(stats)
+            if not dry_run:
+                AuthorStats.objects.bulk_create(missing)
+                AuthorStats.objects.bulk_update(
+                    changed, ['post_count', 'version', 'modified']
+                )
+        return len(missing) + len(changed)
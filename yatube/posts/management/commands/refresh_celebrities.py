@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import feeds
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает авторов, чьи посты не рассылаются по лентам '
+        'подписчиков, и дозаполняет ленты подписчиков выбывших. '
+        'Запускайте по cron раз в несколько минут.'
+    )
+
+    def handle(self, *args, **options):
+        added, dropped = feeds.update_celebrities()
+        self.stdout.write(
+            f'Популярных авторов добавлено: {added}, выбыло: {dropped}'
+        )
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0022_celebrity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingList',
+            fields=[
+                ('key', models.CharField(max_length=32, primary_key=True, serialize=False, verbose_name='Список')),
+                ('ids', models.TextField(blank=True, verbose_name='id через запятую')),
+                ('refreshed', models.DateTimeField(verbose_name='Пересчитан')),
+            ],
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:09
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0023_trendinglist'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='modified',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Страница автора изменена'),
+        ),
+        migrations.AddField(
+            model_name='authorstats',
+            name='version',
+            field=models.PositiveIntegerField(default=0, verbose_name='Версия страницы автора'),
+        ),
+    ]
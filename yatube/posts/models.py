@@ -1,5 +1,6 @@
 from django.contrib.auth import get_user_model
 from django.db import models
+from django.utils import timezone
 
 from core.models import CreatedModel
 
@@ -48,13 +49,80 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    # Заполняются при загрузке, см. posts.images
+    image_width = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Ширина картинки'
+    )
+    image_height = models.PositiveIntegerField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Высота картинки'
+    )
+    # Денормализованы из Comment, см. posts.signals
+    comment_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Число комментариев'
+    )
+    last_commented_at = models.DateTimeField(
+        blank=True,
+        null=True,
+        editable=False,
+        verbose_name='Последний комментарий'
+    )
+    # Входит в ключ кэша карточки поста, см. posts.signals
+    card_version = models.PositiveIntegerField(
+        default=1,
+        editable=False,
+        verbose_name='Версия карточки'
+    )
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            # Индекс читается в обе стороны: и -pub_date, -id для ленты,
+            # и pub_date, id для курсора «назад».
+            models.Index(fields=['pub_date'], name='post_date_idx'),
+            models.Index(
+                fields=['group', 'pub_date'], name='post_group_date_idx'
+            ),
+            models.Index(
+                fields=['author', 'pub_date'], name='post_author_date_idx'
+            ),
+        ]
+
+    # Эти поля сдвигают атомарные UPDATE из posts.signals и posts.counters
+    DENORMALIZED_FIELDS = (
+        'comment_count', 'last_commented_at', 'card_version',
+    )
 
     def __str__(self):
         return self.text[:15]
 
+    def save(self, *args, **kwargs):
+        """Обычное сохранение не затирает денормализованные поля.
+
+        Иначе правка поста записала бы счётчик комментариев, прочитанный
+        в начале запроса, и потеряла бы комментарий, добавленный за это
+        время.
+        """
+        if (
+            not self._state.adding and not kwargs.get('force_insert')
+            and kwargs.get('update_fields') is None
+        ):
+            skipped = (
+                set(self.DENORMALIZED_FIELDS) | self.get_deferred_fields()
+            )
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped
+            ]
+        super().save(*args, **kwargs)
+
 
 class Comment(CreatedModel):
     """Модель комментариев под постами"""
@@ -72,6 +140,15 @@ class Comment(CreatedModel):
     )
     text = models.TextField(verbose_name='Текст комметария')
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'], name='comment_post_created_idx'
+            ),
+            # Окно свежих комментариев для posts.trending
+            models.Index(fields=['created'], name='comment_created_idx'),
+        ]
+
     def __str__(self):
         return self.text
 
@@ -97,3 +174,181 @@ class Follow(CreatedModel):
                 fields=["author", "user"], name="unique_following"
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['user', 'author'], name='follow_user_author_idx'
+            ),
+            models.Index(fields=['created'], name='follow_created_idx'),
+        ]
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    pub_date = models.DateTimeField(verbose_name='Дата публикации')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="unique_feed_entry"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date'], name='feed_user_date_idx'
+            ),
+        ]
+
+
+class AuthorStats(models.Model):
+    """Денормализованные счётчики автора"""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Автор'
+    )
+    post_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Число постов'
+    )
+    # Меняются со всем, что видно на странице автора, см. posts.signals
+    version = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Версия страницы автора'
+    )
+    modified = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Страница автора изменена'
+    )
+
+    def __str__(self):
+        return f'{self.author}: {self.post_count}'
+
+
+class Celebrity(models.Model):
+    """Автор, чьи посты не рассылаются по лентам, см. posts.feeds"""
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='+',
+        verbose_name='Автор'
+    )
+
+    def __str__(self):
+        return str(self.author_id)
+
+
+class PostTerm(models.Model):
+    """Обратный индекс поиска там, где нет FTS5, см. posts.search"""
+    term = models.CharField(max_length=64, verbose_name='Слово')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='terms',
+        verbose_name='Пост'
+    )
+    frequency = models.PositiveIntegerField(verbose_name='Число вхождений')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["term", "post"], name="unique_post_term"
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.term}: {self.post_id}'
+
+
+class FollowSuggestion(models.Model):
+    """Рекомендованный для подписки автор, см. posts.suggestions"""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions',
+        verbose_name='Читатель'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='suggested_to',
+        verbose_name='Автор'
+    )
+    score = models.FloatField(verbose_name='Оценка')
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['user', '-score', 'author'],
+                name='suggestion_user_score_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.user_id} → {self.author_id}: {self.score}'
+
+
+class ActivityBucket(models.Model):
+    """Активность вокруг поста за один час, см. posts.trending"""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='activity',
+        verbose_name='Пост'
+    )
+    hour = models.DateTimeField(verbose_name='Час')
+    comments = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Комментарии'
+    )
+    follows = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Новые подписчики автора'
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["post", "hour"], name="unique_activity_bucket"
+            )
+        ]
+        indexes = [
+            models.Index(fields=['hour'], name='activity_hour_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.post_id} @ {self.hour:%Y-%m-%d %H}:00'
+
+
+class TrendingList(models.Model):
+    """Готовый список популярного, см. posts.trending.refresh"""
+    key = models.CharField(
+        max_length=32,
+        primary_key=True,
+        verbose_name='Список'
+    )
+    ids = models.TextField(blank=True, verbose_name='id через запятую')
+    refreshed = models.DateTimeField(verbose_name='Пересчитан')
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,241 @@
+import base64
+import binascii
+import math
+import re
+import sqlite3
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.db.models import (Case, Count, ExpressionWrapper, F, FloatField,
+                              Q, Sum, When)
+
+from .counters import PostCounter
+from .models import Post, PostTerm
+
+FTS_TABLE = 'posts_post_fts'
+# Внешний контент: FTS5 хранит только индекс, текст читает из posts_post.
+# Триггеры держат индекс в согласии с таблицей при любой записи,
+# включая bulk_create и UPDATE в обход моделей.
+FTS_SCHEMA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "text, content='posts_post', content_rowid='id', "
+    "tokenize='unicode61 remove_diacritics 2')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert "
+    "AFTER INSERT ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete "
+    "AFTER DELETE ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    "END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update "
+    "AFTER UPDATE OF text ON posts_post BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text) "
+    "VALUES ('delete', old.id, old.text); "
+    f"INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text); "
+    "END",
+)
+FTS_TRIGGERS = 3
+# Лишние слова запроса отбрасываются: каждое — ещё один проход по индексу
+MAX_TERMS = 8
+TERM_LENGTH = 64
+ADMIN_RESULTS = 1000
+# Подчёркивание unicode61 считает разделителем, как и мы
+WORD = re.compile(r'[^\W_]+')
+
+
+@lru_cache(maxsize=None)
+def _sqlite_has_fts5():
+    try:
+        sqlite3.connect(':memory:').execute(
+            'CREATE VIRTUAL TABLE probe USING fts5(text)'
+        )
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def uses_fts():
+    """Ищем через FTS5, если база — SQLite, собранная с ним."""
+    return connection.vendor == 'sqlite' and _sqlite_has_fts5()
+
+
+def install(using=DEFAULT_DB_ALIAS):
+    """Создаёт таблицу FTS5 и триггеры, если их ещё нет.
+
+    Вызывается после каждого migrate: SQLite пересоздаёт таблицу
+    при изменении её полей, и триггеры на старой таблице пропадают.
+    Пропавшие триггеры значат, что индекс мог отстать, поэтому
+    после их создания он перестраивается целиком.
+    """
+    db = connections[using]
+    if db.vendor != 'sqlite' or not _sqlite_has_fts5():
+        return
+    with db.cursor() as cursor:
+        if Post._meta.db_table not in db.introspection.table_names(cursor):
+            return
+        cursor.execute(
+            "SELECT COUNT(*) FROM sqlite_master "
+            "WHERE type = 'trigger' AND name LIKE %s",
+            [f'{FTS_TABLE}_%'],
+        )
+        if cursor.fetchone()[0] == FTS_TRIGGERS:
+            return
+        for statement in FTS_SCHEMA:
+            cursor.execute(statement)
+        rebuild_fts(cursor)
+
+
+def rebuild_fts(cursor):
+    cursor.execute(
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')"
+    )
+
+
+def fold(word):
+    """Приводит слово к виду, в котором его хранит unicode61 у FTS5.
+
+    Как и unicode61, диакритику снимаем только с латиницы:
+    café ищется по cafe, а ё и й остаются сами собой.
+    """
+    folded = []
+    for char in word.lower():
+        base = unicodedata.normalize('NFKD', char)[0]
+        folded.append(base if base.isascii() else char)
+    return ''.join(folded)
+
+
+def tokenize(text):
+    return [
+        fold(word) for word in WORD.findall(text)
+        if len(word) <= TERM_LENGTH
+    ]
+
+
+def index_post(post_id, text):
+    """Обновляет записи PostTerm одного поста; только без FTS5.
+
+    Трогаются лишь слова, у которых изменилось число вхождений,
+    так что правка опечатки — это пара строк, а не весь пост.
+    """
+    counts = Counter(tokenize(text))
+    indexed = dict(
+        PostTerm.objects.filter(post_id=post_id)
+        .values_list('term', 'frequency')
+    )
+    changed = {
+        term for term in counts.keys() | indexed.keys()
+        if counts.get(term) != indexed.get(term)
+    }
+    if not changed:
+        return
+    PostTerm.objects.filter(
+        post_id=post_id, term__in=changed & indexed.keys()
+    ).delete()
+    PostTerm.objects.bulk_create(
+        PostTerm(post_id=post_id, term=term, frequency=counts[term])
+        for term in changed & counts.keys()
+    )
+
+
+def encode_cursor(score, pk):
+    raw = f'{score!r}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (score, id) или None для битого токена."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        score, pk = raw.split('|')
+        return float(score), int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+
+
+def _fts_ranked(terms, after, limit):
+    """Ранжирование bm25 самого FTS5; меньший score — лучше."""
+    match = ' '.join(f'"{term}"' for term in terms)
+    params = [match]
+    keyset = ''
+    if after is not None:
+        keyset = 'WHERE score > %s OR (score = %s AND rowid < %s)'
+        params += [after[0], after[0], after[1]]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT score, rowid FROM ('
+            f'SELECT bm25({FTS_TABLE}) AS score, rowid FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s) {keyset} '
+            f'ORDER BY score, rowid DESC LIMIT %s',
+            params + [limit],
+        )
+        return cursor.fetchall()
+
+
+def _terms_ranked(terms, after, limit):
+    """TF-IDF по PostTerm; score со знаком минус, как у bm25."""
+    frequencies = dict(
+        PostTerm.objects.filter(term__in=terms)
+        .values('term').annotate(posts=Count('pk'))
+        .values_list('term', 'posts')
+    )
+    if len(frequencies) < len(terms):
+        return []
+    total = max(PostCounter(Post.objects)(), 1)
+    weights = [
+        When(term=term, then=ExpressionWrapper(
+            F('frequency') * -math.log(1 + total / found),
+            output_field=FloatField(),
+        ))
+        for term, found in frequencies.items()
+    ]
+    rows = (
+        PostTerm.objects.filter(term__in=terms)
+        .values('post_id')
+        .annotate(
+            matched=Count('pk'),
+            score=Sum(Case(*weights, output_field=FloatField())),
+        )
+        .filter(matched=len(terms))
+    )
+    if after is not None:
+        rows = rows.filter(
+            Q(score__gt=after[0]) | Q(score=after[0], post_id__lt=after[1])
+        )
+    return list(
+        rows.order_by('score', '-post_id')
+        .values_list('score', 'post_id')[:limit]
+    )
+
+
+def ranked(query, cursor=None, limit=10):
+    """Лучшие совпадения по запросу: список (score, id) и курсор дальше.
+
+    Все слова запроса должны встретиться в посте. Курсор — ключ
+    (score, id) последнего показанного результата: глубокие страницы
+    не платят за OFFSET.
+    """
+    terms = list(dict.fromkeys(tokenize(query)))[:MAX_TERMS]
+    if not terms:
+        return [], None
+    after = decode_cursor(cursor) if cursor else None
+    backend = _fts_ranked if uses_fts() else _terms_ranked
+    rows = backend(terms, after, limit + 1)
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*rows[-1])
+    return rows, next_cursor
+
+
+def search(query, cursor=None, limit=10):
+    """Посты по запросу в порядке релевантности и курсор дальше."""
+    rows, next_cursor = ranked(query, cursor, limit)
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [pk for _, pk in rows]
+    )
+    return [posts[pk] for _, pk in rows if pk in posts], next_cursor
@@ -0,0 +1,176 @@
+from django.contrib.auth import get_user_model
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F
+from django.db.models.signals import (post_delete, post_init, post_migrate,
+                                      post_save, pre_delete)
+from django.dispatch import receiver
+
+from . import counters, feeds, search, thumbnails
+from .caching import INDEX_GENERATION_KEY, bump_generation
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+# Поля автора, которые видны в карточке поста
+CARD_USER_FIELDS = {'username', 'first_name', 'last_name'}
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    """Запоминаем исходную группу, чтобы заметить перенос поста."""
+    # Отложенное поле читать нельзя: это лишний запрос на каждый пост
+    if 'group_id' not in instance.get_deferred_fields():
+        instance._initial_group_id = instance.group_id
+
+
+@receiver(post_init, sender=Post)
+def remember_image(sender, instance, **kwargs):
+    if 'image' not in instance.get_deferred_fields():
+        instance._initial_image = instance.image.name
+
+
+@receiver(post_save, sender=Post)
+def count_saved_post(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    if created:
+        counters.bump(counters.GLOBAL, None, 1)
+        counters.change_author_post_count(instance.author_id, 1)
+        counters.bump(counters.GROUP, instance.group_id, 1)
+    elif initial_group_id(instance) != instance.group_id:
+        counters.bump(counters.GROUP, initial_group_id(instance), -1)
+        counters.bump(counters.GROUP, instance.group_id, 1)
+    instance._initial_group_id = instance.group_id
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.bump(counters.GLOBAL, None, -1)
+    counters.change_author_post_count(instance.author_id, -1)
+    counters.bump(counters.GROUP, initial_group_id(instance), -1)
+
+
+def initial_group_id(post):
+    return getattr(post, '_initial_group_id', post.group_id)
+
+
+@receiver(post_delete, sender=Group)
+def forget_group_counter(sender, instance, **kwargs):
+    counters.forget(counters.GROUP, instance.pk)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        feeds.fan_out(instance)
+
+
+@receiver(post_save, sender=Post)
+def render_thumbnails(sender, instance, created, raw=False, **kwargs):
+    """Миниатюры рисуются в фоне сразу после загрузки картинки."""
+    if raw or 'image' in instance.get_deferred_fields():
+        return
+    name = instance.image.name
+    initial = getattr(instance, '_initial_image', None)
+    if not name or name == initial and not created:
+        return
+    instance._initial_image = name
+    post_id = instance.pk
+    transaction.on_commit(lambda: thumbnails.schedule(name, post_id))
+
+
+@receiver(post_save, sender=Post)
+def index_post_terms(sender, instance, raw=False, update_fields=None,
+                     **kwargs):
+    """Без FTS5 обратный индекс ведём сами; удаление — каскадом."""
+    if raw or search.uses_fts():
+        return
+    if update_fields is None or 'text' in update_fields:
+        search.index_post(instance.pk, instance.text)
+
+
+@receiver(post_migrate)
+def install_search_index(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    if sender.name == 'posts':
+        search.install(using)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_feed(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        feeds.backfill(instance.user_id, instance.author_id)
+
+
+# Ленту после отписки чистит posts.follows.unfollow: без post_delete
+# на Follow подписки удаляются одним DELETE, без выборки строк
+
+
+def bump_card_versions(posts):
+    """Карточки постов меняются, а с ними и страницы их авторов."""
+    posts.update(card_version=F('card_version') + 1)
+    counters.touch_authors(posts.values('author'))
+
+
+@receiver(post_save, sender=Post)
+def bump_edited_card(sender, instance, created, raw=False, **kwargs):
+    """Версия карточки растёт в базе, а не от прочитанного значения.
+
+    Иначе две правки подряд могли бы вернуть версию, уже лежащую в кэше.
+    """
+    if not created and not raw:
+        Post.objects.filter(pk=instance.pk).update(
+            card_version=F('card_version') + 1
+        )
+        counters.touch_authors([instance.author_id])
+
+
+@receiver(post_save, sender=Group)
+def bump_group_cards(sender, instance, created, raw=False, **kwargs):
+    if not created and not raw:
+        bump_card_versions(instance.posts.all())
+
+
+@receiver(pre_delete, sender=Group)
+def bump_orphaned_cards(sender, instance, **kwargs):
+    bump_card_versions(instance.posts.all())
+
+
+@receiver(post_save, sender=User)
+def bump_author_cards(sender, instance, created, update_fields=None,
+                      raw=False, **kwargs):
+    if not created and not raw and shows_in_feed(update_fields):
+        instance.posts.update(card_version=F('card_version') + 1)
+        # Имя видно на странице автора, даже если постов у него нет
+        counters.touch_authors([instance.pk])
+
+
+def shows_in_feed(update_fields):
+    """Сохранение пользователя меняет ленты, только если задело имя.
+
+    Вход на сайт сохраняет одно поле last_login и кэш не трогает.
+    """
+    return update_fields is None or bool(CARD_USER_FIELDS & update_fields)
+
+
+@receiver(post_save, sender=Comment)
+def count_saved_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        counters.comment_added(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.comment_removed(instance)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_index(sender, raw=False, update_fields=None, **kwargs):
+    if raw or sender is User and not shows_in_feed(update_fields):
+        return
+    bump_generation(INDEX_GENERATION_KEY)
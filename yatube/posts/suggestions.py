@@ -0,0 +1,217 @@
+import heapq
+from array import array
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef
+
+from .models import Follow, FollowSuggestion, Post
+
+# Сколько рекомендаций храним на читателя и сколько показываем
+SUGGESTIONS_STORED = 20
+SUGGESTIONS_SHOWN = 5
+# Выборки ограничивают работу на популярных авторах и активных читателях
+FOLLOWER_SAMPLE = 100
+FOLLOWING_SAMPLE = 100
+NEIGHBOURS = 20
+GROUP_AUTHORS = 20
+POPULAR_AUTHORS = 20
+# Вклад одного общего подписчика — единица; группы и популярность слабее
+GROUP_WEIGHT = 0.5
+POPULAR_WEIGHT = 0.1
+CHUNK_SIZE = 10000
+# Сколько id подставлять в один IN при чтении окрестности читателей
+IDS_PER_QUERY = 500
+
+
+class SparseRows:
+    """Строки разреженной 0/1-матрицы в формате CSR.
+
+    Номера столбцов лежат подряд в одном array, по 8 байт на связь,
+    а для каждой строки хранится только срез. Пары должны приходить
+    отсортированными по строке.
+    """
+
+    def __init__(self, pairs):
+        self.columns = array('q')
+        self.offsets = {}
+        row = start = None
+        for row_id, column in pairs:
+            if row_id != row:
+                if row is not None:
+                    self.offsets[row] = (start, len(self.columns))
+                row, start = row_id, len(self.columns)
+            self.columns.append(column)
+        if row is not None:
+            self.offsets[row] = (start, len(self.columns))
+
+    def row(self, row_id, limit=None):
+        """Столбцы строки; с limit — только последние limit штук."""
+        start, end = self.offsets.get(row_id, (0, 0))
+        if limit is not None:
+            start = max(start, end - limit)
+        return self.columns[start:end]
+
+    def size(self, row_id):
+        start, end = self.offsets.get(row_id, (0, 0))
+        return end - start
+
+
+def _pairs(*fields, ids=None):
+    """Пары подписок по возрастанию; с ids — только для этих строк."""
+    pairs = Follow.objects.order_by(*fields).values_list(*fields)
+    if ids is None:
+        yield from pairs.iterator(chunk_size=CHUNK_SIZE)
+        return
+    ids = sorted(ids)
+    for start in range(0, len(ids), IDS_PER_QUERY):
+        yield from pairs.filter(**{
+            f'{fields[0]}__in': ids[start:start + IDS_PER_QUERY]
+        }).iterator(chunk_size=CHUNK_SIZE)
+
+
+def popular_authors():
+    """Авторы с наибольшим числом подписчиков, одним GROUP BY."""
+    return list(Follow.objects.values('author').annotate(
+        followers=Count('pk')
+    ).order_by('-followers', 'author').values_list(
+        'author', flat=True
+    )[:POPULAR_AUTHORS])
+
+
+class Recommender:
+    """Считает, на кого ещё подписаться, по графу подписок и группам.
+
+    Граф подписок читается проходом по индексу (user, author)
+    в две CSR-матрицы: «кто на кого подписан» и «у кого какие
+    подписчики». Соседи автора — авторы, на которых чаще всего
+    подписаны его же подписчики (совместные подписки); рекомендации
+    читателю складываются из соседей тех, на кого он подписан,
+    авторов его групп и самых популярных авторов.
+    """
+
+    def __init__(self, readers=None, popular=None):
+        """Без readers читает весь граф; с readers — только окрестность.
+
+        Окрестность — авторы, на которых подписаны readers, выборка
+        их подписчиков и подписки этих подписчиков: ровно то, что
+        читает suggest для readers. popular — готовый список популярных
+        авторов (например, с прошлого полного пересчёта).
+        """
+        if readers is None:
+            self.following = SparseRows(_pairs('user', 'author'))
+            self.followers = SparseRows(_pairs('author', 'user'))
+            authors = None
+        else:
+            readers = set(readers)
+            authors = {
+                author_id
+                for _, author_id in _pairs('user', 'author', ids=readers)
+            }
+            self.followers = SparseRows(
+                _pairs('author', 'user', ids=authors)
+            )
+            sampled = {
+                follower for author_id in authors
+                for follower in self.followers.row(author_id, FOLLOWER_SAMPLE)
+            }
+            self.following = SparseRows(
+                _pairs('user', 'author', ids=readers | sampled)
+            )
+            authors |= readers
+        self.user_groups = self._user_groups(authors)
+        self.group_authors = self._group_authors(
+            None if authors is None
+            else set().union(*self.user_groups.values())
+        )
+        if popular is None and authors is None:
+            popular = heapq.nlargest(
+                POPULAR_AUTHORS, self.followers.offsets,
+                key=self.followers.size,
+            )
+        elif popular is None:
+            popular = popular_authors()
+        self.popular = popular
+        self._neighbours = {}
+
+    def _user_groups(self, author_ids=None):
+        """Группы, в которых писали авторы (все или только author_ids)."""
+        posts = Post.objects.filter(group__isnull=False)
+        if author_ids is not None:
+            posts = posts.filter(author__in=author_ids)
+        user_groups = defaultdict(set)
+        for author_id, group_id in posts.order_by().values_list(
+            'author', 'group'
+        ).distinct().iterator(chunk_size=CHUNK_SIZE):
+            user_groups[author_id].add(group_id)
+        return user_groups
+
+    def _group_authors(self, group_ids=None):
+        """Самые пишущие авторы каждой группы (всех или group_ids)."""
+        group_authors = defaultdict(list)
+        posts = Post.objects.filter(group__isnull=False)
+        if group_ids is not None:
+            posts = posts.filter(group__in=group_ids)
+        rows = posts.values('group', 'author').annotate(
+            posts=Count('pk')
+        ).order_by('group', '-posts', 'author')
+        for row in rows.iterator(chunk_size=CHUNK_SIZE):
+            authors = group_authors[row['group']]
+            if len(authors) < GROUP_AUTHORS:
+                authors.append(row['author'])
+        return group_authors
+
+    def neighbours(self, author_id):
+        """Авторы, на которых подписаны вместе с author_id, и сколько раз."""
+        if author_id not in self._neighbours:
+            together = Counter()
+            for follower in self.followers.row(author_id, FOLLOWER_SAMPLE):
+                together.update(self.following.row(follower, FOLLOWING_SAMPLE))
+            del together[author_id]
+            self._neighbours[author_id] = together.most_common(NEIGHBOURS)
+        return self._neighbours[author_id]
+
+    def suggest(self, user_id):
+        """Лучшие SUGGESTIONS_STORED авторов для читателя: (id, оценка)."""
+        followed = self.following.row(user_id)
+        scores = Counter()
+        groups = set(self.user_groups.get(user_id, ()))
+        for author_id in self.following.row(user_id, FOLLOWING_SAMPLE):
+            for other, together in self.neighbours(author_id):
+                scores[other] += together
+            groups |= self.user_groups.get(author_id, set())
+        for group_id in groups:
+            for author_id in self.group_authors.get(group_id, ()):
+                scores[author_id] += GROUP_WEIGHT
+        for author_id in self.popular:
+            scores[author_id] += POPULAR_WEIGHT
+        for author_id in (user_id, *followed):
+            scores.pop(author_id, None)
+        return heapq.nlargest(
+            SUGGESTIONS_STORED, scores.items(),
+            key=lambda item: (item[1], -item[0]),
+        )
+
+    def store(self, user_ids):
+        """Заменяет рекомендации пачки читателей одной транзакцией."""
+        rows = [
+            FollowSuggestion(user_id=user_id, author_id=author_id, score=score)
+            for user_id in user_ids
+            for author_id, score in self.suggest(user_id)
+        ]
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=user_ids).delete()
+            FollowSuggestion.objects.bulk_create(rows, batch_size=1000)
+        return len(rows)
+
+
+def for_user(user, limit=SUGGESTIONS_SHOWN):
+    """Рекомендованные авторы одним запросом, без уже подписанных."""
+    suggestions = FollowSuggestion.objects.filter(user=user).annotate(
+        followed=Exists(
+            Follow.objects.filter(user=user, author=OuterRef('author'))
+        )
+    ).filter(followed=False).select_related('author').order_by(
+        '-score', 'author_id'
+    )
+    return [suggestion.author for suggestion in suggestions[:limit]]
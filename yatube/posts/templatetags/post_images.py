@@ -0,0 +1,36 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+def ready_variants(post):
+    """Готовые варианты картинки поста или None, пока их рисует воркер.
+
+    Неготовую картинку ставит в очередь: шаблон показывает заглушку,
+    и запрос не ждёт ресайза. Ленты заранее собирают варианты всей
+    страницы через thumbnails.prefetch.
+    """
+    name = post.image.name
+    if hasattr(post, 'ready_thumbnails'):
+        ready = post.ready_thumbnails
+    else:
+        ready = thumbnails.ready_thumbnails(name)
+    if not thumbnails.is_complete(ready):
+        thumbnails.schedule(name, post.pk)
+        ready = thumbnails.ready_thumbnails(name)
+    return ready if thumbnails.is_complete(ready) else None
+
+
+@register.inclusion_tag('posts/includes/post_picture.html')
+def post_picture(post):
+    """<picture> с вариантами картинки поста в WebP и JPEG."""
+    context = {'post': post}
+    if post.image:
+        ready = ready_variants(post)
+        if ready is not None:
+            context['srcsets'], context['src'] = thumbnails.srcsets(
+                ready, post.image_width
+            )
+    return context
@@ -0,0 +1,57 @@
+import random
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from posts.benchmark import (BENCHMARK_CACHES, MIX, Replay, compare,
+                             percentile, seed)
+from posts.models import AuthorStats, FeedEntry, Post
+
+
+class BenchmarkTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        seed(random.Random(1), users=5, groups=2, posts=40, comments=30,
+             follows=6, images=0)
+
+    def test_seed_keeps_denormalized_data_consistent(self):
+        """После наполнения счётчики и ленты подписок досчитаны."""
+        self.assertEqual(Post.objects.count(), 40)
+        self.assertEqual(
+            sum(AuthorStats.objects.values_list('post_count', flat=True)), 40
+        )
+        self.assertTrue(FeedEntry.objects.exists())
+        dates = Post.objects.values_list('pub_date', flat=True)
+        self.assertEqual(len(set(dates)), 40)
+
+    def test_replay_reports_every_endpoint(self):
+        """Смесь запросов проходит без ошибок и даёт процентили."""
+        results = Replay(random.Random(2)).run(120)
+        self.assertEqual(results['requests'], 120)
+        self.assertEqual(results['errors'], 0)
+        self.assertEqual(set(results['endpoints']), {name for name, _ in MIX})
+        for stats in results['endpoints'].values():
+            self.assertLessEqual(stats['p50'], stats['p99'])
+
+    def test_replay_keeps_site_cache(self):
+        """Прогон в своём кэше не очищает кэш сайта."""
+        cache.set('site_key', 'value')
+        with override_settings(CACHES=BENCHMARK_CACHES):
+            Replay(random.Random(3)).run(10)
+        self.assertEqual(cache.get('site_key'), 'value')
+
+    def test_compare_flags_regressions(self):
+        """Рост p95 сверх допуска и лишние запросы к БД — регрессия."""
+        baseline = {'endpoints': {'index': {'p95': 10.0, 'queries': 2.0}}}
+        slower = {'endpoints': {'index': {'p95': 14.0, 'queries': 2.0}}}
+        heavier = {'endpoints': {'index': {'p95': 10.0, 'queries': 5.0}}}
+        self.assertEqual(compare(baseline, baseline, 0.25), [])
+        self.assertEqual(len(compare(slower, baseline, 0.25)), 1)
+        self.assertEqual(len(compare(heavier, baseline, 0.25)), 1)
+
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile([7], 95), 7)
@@ -0,0 +1,58 @@
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase
+
+from posts.caching import (HIT, bump_generation, cache_metrics,
+                           flush_metrics, generation_modified,
+                           get_generation, record)
+
+GENERATION_KEY = 'test:generation'
+
+
+class GenerationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def later(self):
+        """Время, когда ключ со сроком по умолчанию уже истёк бы."""
+        timeout = settings.CACHES['default'].get('TIMEOUT', 300)
+        return mock.patch('time.time', return_value=time.time() + timeout + 1)
+
+    def test_generation_does_not_expire(self):
+        generation = get_generation(GENERATION_KEY)
+        with self.later():
+            self.assertEqual(get_generation(GENERATION_KEY), generation)
+            self.assertIsNotNone(generation_modified(GENERATION_KEY))
+
+    def test_bumped_generation_does_not_expire(self):
+        bump_generation(GENERATION_KEY)
+        generation = get_generation(GENERATION_KEY)
+        bump_generation(GENERATION_KEY)
+        with self.later():
+            self.assertEqual(
+                get_generation(GENERATION_KEY), generation + 1
+            )
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        flush_metrics()
+        cache.clear()
+
+    def test_hits_are_buffered_in_process(self):
+        """Попадание не пишет в кэш, пока пачка не набралась."""
+        with mock.patch('posts.caching.cache') as mocked:
+            record('test_page', HIT)
+        mocked.add.assert_not_called()
+        mocked.incr.assert_not_called()
+        self.assertEqual(cache_metrics('test_page')[HIT], 1)
+
+    def test_full_batch_is_flushed(self):
+        with mock.patch('posts.caching.METRICS_FLUSH_SIZE', 3):
+            for _ in range(3):
+                record('test_page', HIT)
+        with mock.patch('posts.caching.flush_metrics'):
+            self.assertEqual(cache_metrics('test_page')[HIT], 3)
@@ -0,0 +1,195 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.counters import (
+    GLOBAL, GROUP, PostCounter, author_post_count, counter_key
+)
+from posts.models import AuthorStats, Comment, Group, Post
+
+User = get_user_model()
+
+
+class PostCounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='counter_user')
+        cls.group = Group.objects.create(
+            title='Группа счётчика',
+            slug='counter_group',
+            description='Описание',
+        )
+        cls.group_two = Group.objects.create(
+            title='Вторая группа',
+            slug='counter_group_two',
+            description='Описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Первый пост',
+            group=cls.group,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.total = PostCounter(Post.objects.all(), GLOBAL)
+        self.by_group = PostCounter(
+            self.group.posts.all(), GROUP, self.group.pk
+        )
+        self.by_group_two = PostCounter(
+            self.group_two.posts.all(), GROUP, self.group_two.pk
+        )
+
+    def test_cold_counter_is_seeded_exactly(self):
+        """Холодный счётчик засевается точным числом, а не MAX(id)."""
+        Post.objects.filter(
+            pk=Post.objects.create(author=self.user, text='Удалённый').pk
+        ).delete()
+        self.assertEqual(self.total(), 1)
+        self.assertEqual(cache.get(counter_key(GLOBAL)), 1)
+
+    def test_estimate_is_not_cached_while_seeding(self):
+        """Пока другой запрос засевает счётчик, отдаём оценку без кэша."""
+        cache.add(f'{counter_key(GLOBAL)}:seed', True)
+        self.assertGreaterEqual(self.total(), 1)
+        self.assertIsNone(cache.get(counter_key(GLOBAL)))
+
+    def test_counters_follow_create_edit_delete(self):
+        """Счётчики меняются при создании, переносе и удалении поста."""
+        self.by_group()
+        self.by_group_two()
+        post = Post.objects.create(
+            author=self.user, text='Второй пост', group=self.group
+        )
+        self.assertEqual(self.by_group(), 2)
+        post.group = self.group_two
+        post.save()
+        self.assertEqual(self.by_group(), 1)
+        self.assertEqual(self.by_group_two(), 1)
+        post.delete()
+        self.assertEqual(self.by_group_two(), 0)
+
+    def test_warm_counter_skips_count_query(self):
+        """Прогретый счётчик не обращается к базе."""
+        self.by_group()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.by_group(), 1)
+
+
+class AuthorStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='stats_user')
+        Post.objects.create(author=cls.user, text='Пост до счётчика')
+
+    def setUp(self):
+        # Свежий экземпляр: кэш связи stats не переживает тест
+        self.author = User.objects.get(pk=AuthorStatsTests.user.pk)
+
+    def test_stats_row_is_created_on_first_read(self):
+        """Счётчик заводится при первом чтении по реальному числу."""
+        self.assertEqual(author_post_count(self.author), 1)
+        stats = AuthorStats.objects.get(author=self.user)
+        self.assertEqual(stats.post_count, 1)
+
+    def test_counter_follows_create_and_delete(self):
+        """Создание и удаление поста меняют счётчик через F()."""
+        author_post_count(self.author)
+        post = Post.objects.create(author=self.author, text='Ещё пост')
+        self.author.refresh_from_db()
+        self.assertEqual(author_post_count(self.author), 2)
+        post.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(author_post_count(self.author), 1)
+
+    def test_reconcile_command_fixes_drift(self):
+        """Команда reconcile_post_counts чинит разошедшийся счётчик."""
+        AuthorStats.objects.create(author=self.user, post_count=7)
+        out = StringIO()
+        call_command('reconcile_post_counts', stdout=out)
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.user).post_count, 1
+        )
+        self.assertIn('1', out.getvalue())
+
+
+class CommentStatsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='comment_stats_user')
+        cls.post = Post.objects.create(author=cls.user, text='Пост')
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+        self.post.refresh_from_db()
+
+    def add_comment(self, text):
+        self.authorized_client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            data={'text': text},
+        )
+        return Comment.objects.latest('created')
+
+    def test_stats_follow_add_and_delete(self):
+        """Счётчик и время активности следуют за комментариями."""
+        first = self.add_comment('Первый')
+        second = self.add_comment('Второй')
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+        self.assertEqual(self.post.last_commented_at, second.created)
+        second.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.post.last_commented_at, first.created)
+        first.delete()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+        self.assertIsNone(self.post.last_commented_at)
+
+    def test_comment_bumps_card_version(self):
+        """Новый комментарий сбрасывает кэш карточки поста."""
+        version = self.post.card_version
+        self.add_comment('Комментарий')
+        self.post.refresh_from_db()
+        self.assertGreater(self.post.card_version, version)
+
+    def test_edit_keeps_comment_added_meanwhile(self):
+        """Правка поста не затирает счётчики значениями из начала запроса."""
+        edited = Post.objects.get(pk=self.post.pk)
+        comment = self.add_comment('Комментарий')
+        self.post.refresh_from_db()
+        version = self.post.card_version
+        edited.text = 'Исправленный пост'
+        edited.save()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.text, 'Исправленный пост')
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.post.last_commented_at, comment.created)
+        self.assertGreater(self.post.card_version, version)
+
+    def test_backfill_command_fixes_drift(self):
+        """Команда backfill_comment_stats чинит разошедшиеся поля."""
+        comment = self.add_comment('Комментарий')
+        Post.objects.filter(pk=self.post.pk).update(
+            comment_count=5, last_commented_at=None
+        )
+        author_post_count(self.post.author)
+        version = AuthorStats.objects.get(author=self.post.author).version
+        out = StringIO()
+        call_command('backfill_comment_stats', batch_size=1, stdout=out)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+        self.assertEqual(self.post.last_commented_at, comment.created)
+        self.assertIn('1', out.getvalue())
+        # Карточка на странице автора изменилась
+        self.assertGreater(
+            AuthorStats.objects.get(author=self.post.author).version, version
+        )
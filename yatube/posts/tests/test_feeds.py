@@ -0,0 +1,130 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from posts import feeds, follows
+from posts.feeds import timeline
+from posts.models import Celebrity, FeedEntry, Follow, Post
+
+User = get_user_model()
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='writer')
+        cls.old_post = Post.objects.create(
+            author=cls.author,
+            text='Пост до подписки',
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка дозаполняет ленту, отписка её очищает."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(list(timeline(self.reader)), [self.old_post])
+        follows.unfollow(self.reader, [self.author.username])
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+        self.assertEqual(list(timeline(self.reader)), [])
+
+    def test_new_post_is_pushed_to_followers(self):
+        """Новый пост попадает в ленты подписчиков при создании."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(author=self.author, text='Новый пост')
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertEqual(timeline(self.reader)[0], post)
+
+    def test_popular_author_is_read_on_demand(self):
+        """Посты популярного автора подмешиваются при чтении."""
+        with mock.patch('posts.feeds.FANOUT_LIMIT', 0):
+            Follow.objects.create(user=self.reader, author=self.author)
+            call_command('refresh_celebrities', stdout=StringIO())
+            post = Post.objects.create(author=self.author, text='Для всех')
+            self.assertFalse(
+                FeedEntry.objects.filter(post=post).exists()
+            )
+            self.assertEqual(
+                list(timeline(self.reader)), [post, self.old_post]
+            )
+
+    def test_dropped_celebrity_feeds_are_backfilled(self):
+        """Выбывший из популярных автор снова попадает в ленты."""
+        Celebrity.objects.create(author=self.author)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(feeds.update_celebrities(), (0, 1))
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=self.old_post
+        ).exists())
+
+    def test_backfill_inserts_by_follower_chunks(self):
+        """Записи лент собираются частями, а не все разом."""
+        Post.objects.create(author=self.author, text='Второй пост')
+        readers = [
+            User.objects.create_user(username=f'chunk_reader_{number}')
+            for number in range(3)
+        ]
+        Follow.objects.bulk_create([
+            Follow(user=reader, author=self.author) for reader in readers
+        ])
+        create = FeedEntry.objects.bulk_create
+        with mock.patch('posts.feeds.BACKFILL_CHUNK', 2), mock.patch.object(
+            FeedEntry.objects, 'bulk_create', side_effect=create
+        ) as bulk_create:
+            feeds.backfill_authors([self.author.pk])
+        self.assertEqual(bulk_create.call_count, 3)
+        for call in bulk_create.call_args_list:
+            self.assertEqual(len(call[0][0]), 2)
+        self.assertEqual(
+            FeedEntry.objects.filter(user__in=readers).count(), 6
+        )
+
+    def test_command_fills_feeds_of_existing_follows(self):
+        """Подписки, заведённые до FeedEntry, получают свои ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        FeedEntry.objects.all().delete()
+        for _ in range(2):
+            call_command('backfill_feeds', stdout=StringIO())
+        self.assertEqual(list(timeline(self.reader)), [self.old_post])
+        self.assertEqual(FeedEntry.objects.count(), 1)
+
+    def test_celebrities_are_read_without_group_by(self):
+        """На пути запроса список читается из таблицы, а не считается."""
+        Celebrity.objects.create(author=self.author)
+        with self.assertNumQueries(1):
+            self.assertEqual(feeds.celebrity_ids(), {self.author.pk})
+        with self.assertNumQueries(0):
+            feeds.celebrity_ids()
+
+    def test_feed_is_trimmed_on_write(self):
+        """В ленте читателя остаются только FEED_LENGTH последних постов."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with mock.patch('posts.feeds.FEED_LENGTH', 2), \
+                mock.patch('posts.feeds.TRIM_RATE', 1):
+            posts = [
+                Post.objects.create(author=self.author, text=f'Пост {number}')
+                for number in range(3)
+            ]
+        self.assertEqual(
+            set(FeedEntry.objects.filter(
+                user=self.reader
+            ).values_list('post', flat=True)),
+            {posts[1].pk, posts[2].pk},
+        )
+
+    def test_backfill_does_not_read_deferred_group(self):
+        """Посты из .only() не дочитывают group_id в post_init."""
+        Post.objects.create(author=self.author, text='Второй пост')
+        feeds.celebrity_ids()
+        with self.assertNumQueries(4):
+            Follow.objects.create(user=self.reader, author=self.author)
@@ -0,0 +1,132 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import feeds, follows
+from posts.models import FeedEntry, Follow, Post
+
+User = get_user_model()
+
+
+class FollowServiceTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='bulk_reader')
+        cls.authors = [
+            User.objects.create_user(username=f'bulk_author_{number}')
+            for number in range(3)
+        ]
+        cls.post = Post.objects.create(
+            author=cls.authors[0], text='Пост для ленты'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+        self.names = [author.username for author in self.authors]
+
+    def bulk(self, payload):
+        return self.client.post(
+            reverse('posts:follow_bulk'),
+            json.dumps(payload) if not isinstance(payload, str) else payload,
+            content_type='application/json',
+        )
+
+    def test_follow_is_idempotent(self):
+        followed, unknown = follows.follow(self.reader, self.names)
+        self.assertEqual(followed, sorted(self.names))
+        self.assertEqual(unknown, [])
+        followed, _ = follows.follow(self.reader, self.names)
+        self.assertEqual(followed, [])
+        self.assertEqual(self.reader.follower.count(), 3)
+
+    def test_follow_backfills_feed(self):
+        """bulk_create не шлёт сигналов: ленту дозаполняет сервис."""
+        follows.follow(self.reader, [self.authors[0].username])
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=self.post
+        ).exists())
+
+    def test_cannot_follow_self_or_unknown(self):
+        followed, unknown = follows.follow(
+            self.reader, [self.reader.username, 'nobody']
+        )
+        self.assertEqual(followed, [])
+        self.assertEqual(unknown, ['nobody'])
+        self.assertFalse(self.reader.follower.exists())
+
+    def test_single_follow_queries(self):
+        """Подписка — выборка, INSERT и чтение постов в одной транзакции."""
+        author = self.authors[1]
+        feeds.celebrity_ids()
+        with self.assertNumQueries(5):
+            follows.follow(self.reader, [author.username])
+        with self.assertNumQueries(1):
+            follows.follow(self.reader, [author.username])
+
+    def test_bulk_follow_queries_do_not_grow_with_authors(self):
+        """Посты всех новых авторов читаются и пишутся в ленту разом."""
+        for author in self.authors[1:]:
+            Post.objects.create(author=author, text='Ещё пост')
+        feeds.celebrity_ids()
+        # Выборка авторов, SAVEPOINT, INSERT подписок, SELECT постов,
+        # INSERT ленты, DELETE лишнего из ленты, RELEASE
+        with self.assertNumQueries(7):
+            follows.follow(self.reader, self.names)
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 3
+        )
+
+    def test_unfollow_prunes_feed_without_per_row_signals(self):
+        names = [author.username for author in self.authors[:2]]
+        follows.follow(self.reader, names)
+        # Два DELETE в одной транзакции, без SELECT подписок
+        with self.assertNumQueries(4):
+            self.assertEqual(follows.unfollow(self.reader, names), 2)
+        self.assertFalse(self.reader.follower.exists())
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+
+    def test_bulk_endpoint(self):
+        Follow.objects.create(user=self.reader, author=self.authors[2])
+        response = self.bulk({
+            'follow': self.names[:2] + ['nobody'],
+            'unfollow': [self.names[2]],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'followed': sorted(self.names[:2]),
+            'unfollowed': 1,
+            'unknown': ['nobody'],
+        })
+        self.assertEqual(
+            set(self.reader.follower.values_list('author', flat=True)),
+            {self.authors[0].pk, self.authors[1].pk},
+        )
+
+    def test_bulk_endpoint_rejects_bad_payload(self):
+        for payload in ('не json', [], {'follow': 'bulk_author_0'}):
+            with self.subTest(payload=payload):
+                self.assertEqual(self.bulk(payload).status_code, 400)
+        too_many = {'follow': ['x'] * (follows.MAX_BULK_FOLLOWS + 1)}
+        self.assertEqual(self.bulk(too_many).status_code, 400)
+
+    def test_bulk_endpoint_requires_post_and_login(self):
+        url = reverse('posts:follow_bulk')
+        self.assertEqual(self.client.get(url).status_code, 405)
+        response = Client().post(url, '{}', content_type='application/json')
+        self.assertEqual(response.status_code, 302)
+
+    def test_follow_unknown_profile(self):
+        response = self.client.get(
+            reverse('posts:profile_follow', args=['nobody'])
+        )
+        self.assertRedirects(
+            response,
+            reverse('posts:profile', args=['nobody']),
+            target_status_code=404,
+        )
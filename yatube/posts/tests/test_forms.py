@@ -1,11 +1,14 @@
 import shutil
 import tempfile
+from io import BytesIO
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.forms import PostForm
 from posts.models import Comment, Group, Post
@@ -163,3 +166,61 @@ class PostCreateFormTests(TestCase):
                 ) + 'comment/'
             )
         )
+
+
+def make_jpeg(size, name='photo.jpg'):
+    exif = Image.Exif()
+    exif[0x010F] = 'Камера'
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif)
+    return SimpleUploadedFile(
+        name=name, content=buffer.getvalue(), content_type='image/jpeg'
+    )
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class PostImageUploadTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='upload_user')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def create(self, image):
+        return self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с фото', 'image': image},
+        )
+
+    @mock.patch('posts.images.MAX_SIDE', 100)
+    def test_large_image_is_downscaled_without_metadata(self):
+        """Большой оригинал ужимается, EXIF вырезается, размеры пишутся."""
+        self.create(make_jpeg((400, 200)))
+        post = Post.objects.get(author=self.user)
+        self.assertEqual((post.image_width, post.image_height), (100, 50))
+        with Image.open(post.image.path) as stored:
+            self.assertEqual(stored.size, (100, 50))
+            self.assertNotIn('exif', stored.info)
+
+    def test_small_image_keeps_size(self):
+        """Картинка меньше предела сохраняется в исходном размере."""
+        self.create(make_jpeg((40, 30)))
+        post = Post.objects.get(author=self.user)
+        self.assertEqual((post.image_width, post.image_height), (40, 30))
+
+    @mock.patch('posts.images.MAX_PIXELS', 100)
+    def test_too_many_pixels_is_rejected(self):
+        """Слишком большая по заголовку картинка не принимается."""
+        response = self.create(make_jpeg((20, 20)))
+        self.assertFormError(
+            response, 'form', 'image', 'Картинка больше 0 мегапикселей.'
+        )
+        self.assertFalse(Post.objects.filter(author=self.user).exists())
@@ -0,0 +1,92 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Полный проход по таблице без индекса: «SCAN posts_post»
+TABLE_SCAN = re.compile(r'^SCAN (TABLE )?\w+( AS \w+)?$')
+# Маленькие таблицы, которые читаются целиком и кэшируются
+WHOLE_TABLES = ('FROM "posts_celebrity"',)
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='planner')
+        cls.reader = User.objects.create_user(username='plan_reader')
+        cls.group = Group.objects.create(
+            title='План',
+            slug='plan',
+            description='Описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост',
+            group=cls.group,
+        )
+        Comment.objects.create(post=cls.post, author=cls.user, text='Ок')
+        Follow.objects.create(user=cls.reader, author=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(QueryPlanTests.reader)
+
+    def query_plans(self, url):
+        """Планы всех запросов к таблицам posts, сделанных страницей."""
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(url)
+        plans = []
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT') or 'posts_' not in sql:
+                continue
+            if any(table in sql for table in WHOLE_TABLES):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plans.append((sql, [row[-1] for row in cursor.fetchall()]))
+        return plans
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент идут по индексам и не сортируют таблицу."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:index') + '?cursor=',
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': self.user}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+        for url in urls:
+            for sql, plan in self.query_plans(url):
+                with self.subTest(url=url, sql=sql):
+                    self.assertFalse(
+                        any(TABLE_SCAN.match(step) for step in plan), plan
+                    )
+                    self.assertFalse(
+                        any('TEMP B-TREE' in step for step in plan), plan
+                    )
+
+    def test_follow_feed_reads_entries_by_index(self):
+        """Лента подписок читается по индексу (user, pub_date)."""
+        url = reverse('posts:follow_index')
+        plans = self.query_plans(url)
+        for sql, plan in plans:
+            with self.subTest(sql=sql):
+                self.assertFalse(
+                    any(TABLE_SCAN.match(step) for step in plan), plan
+                )
+        self.assertTrue(any(
+            'feed_user_date_idx' in step for _, plan in plans for step in plan
+        ))
@@ -0,0 +1,148 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import search
+from posts.models import Post, PostTerm
+
+User = get_user_model()
+
+
+class SearchMixin:
+    """Общие проверки для FTS5 и обратного индекса PostTerm."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='search_user')
+        self.sea = Post.objects.create(
+            author=self.user, text='Море, море и ещё раз Море!'
+        )
+        self.beach = Post.objects.create(
+            author=self.user, text='На берегу моря тёплое море'
+        )
+        self.mountain = Post.objects.create(
+            author=self.user, text='Горы выше облаков'
+        )
+
+    def found(self, query, **kwargs):
+        posts, _ = search.search(query, **kwargs)
+        return [post.pk for post in posts]
+
+    def test_finds_words_regardless_of_case(self):
+        """Поиск не зависит от регистра и диакритики латиницы."""
+        cafe = Post.objects.create(author=self.user, text='Café у моря')
+        self.assertEqual(self.found('ГОРЫ'), [self.mountain.pk])
+        self.assertEqual(self.found('тёплое'), [self.beach.pk])
+        self.assertEqual(self.found('CAFE'), [cafe.pk])
+
+    def test_ranks_by_relevance(self):
+        """Пост, где слово встречается чаще, идёт первым."""
+        self.assertEqual(self.found('море'), [self.sea.pk, self.beach.pk])
+
+    def test_requires_every_word(self):
+        """Все слова запроса должны встретиться в посте."""
+        self.assertEqual(self.found('море берегу'), [self.beach.pk])
+        self.assertEqual(self.found('море облаков'), [])
+
+    def test_ignores_query_syntax(self):
+        """Кавычки и операторы из запроса не ломают поиск."""
+        self.assertEqual(self.found('"море" OR*'), [])
+        self.assertEqual(self.found('"горы'), [self.mountain.pk])
+        self.assertEqual(self.found('!!!'), [])
+
+    def test_edit_and_delete_update_index(self):
+        """Правка и удаление поста сразу видны в поиске."""
+        self.mountain.text = 'Горное море'
+        self.mountain.save()
+        self.assertEqual(self.found('горы'), [])
+        self.assertIn(self.mountain.pk, self.found('море'))
+        self.sea.delete()
+        self.assertNotIn(self.sea.pk, self.found('море'))
+
+    def test_cursor_pagination(self):
+        """Курсоры проходят все результаты без повторов."""
+        for number in range(5):
+            Post.objects.create(author=self.user, text=f'Пляж {number}')
+        seen = []
+        cursor = None
+        while True:
+            posts, cursor = search.search('пляж', cursor, limit=2)
+            seen += [post.pk for post in posts]
+            if cursor is None:
+                break
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_bad_cursor_starts_over(self):
+        self.assertEqual(
+            self.found('море', cursor='!!'), [self.sea.pk, self.beach.pk]
+        )
+
+    def test_search_page(self):
+        response = Client().get(reverse('posts:search'), {'q': 'горы'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['posts'], [self.mountain])
+        self.assertContains(response, 'Горы выше облаков')
+
+    def test_admin_search(self):
+        admin = User.objects.create_superuser(
+            'search_admin', 'admin@example.com', 'password'
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'море'}
+        )
+        self.assertEqual(
+            set(post.pk for post in response.context['cl'].result_list),
+            {self.sea.pk, self.beach.pk},
+        )
+
+
+class FTSSearchTests(SearchMixin, TestCase):
+    def setUp(self):
+        if not search.uses_fts():
+            self.skipTest('SQLite собран без FTS5')
+        super().setUp()
+
+    def test_bulk_create_is_indexed(self):
+        """Триггеры индексируют и посты, созданные в обход моделей."""
+        Post.objects.bulk_create([Post(author=self.user, text='Вулкан')])
+        self.assertEqual(len(self.found('вулкан')), 1)
+        self.assertFalse(PostTerm.objects.exists())
+
+    def test_install_restores_lost_triggers(self):
+        """Пропавшие триггеры создаются заново, индекс перестраивается."""
+        with search.connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {search.FTS_TABLE}_insert')
+        Post.objects.create(author=self.user, text='Ледник')
+        self.assertEqual(self.found('ледник'), [])
+        search.install()
+        self.assertEqual(len(self.found('ледник')), 1)
+
+
+class TermIndexSearchTests(SearchMixin, TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(search, 'uses_fts', return_value=False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        super().setUp()
+
+    def test_unchanged_text_is_not_reindexed(self):
+        self.sea.text = 'Море, море и ещё раз Море!'
+        with self.assertNumQueries(1):
+            search.index_post(self.sea.pk, self.sea.text)
+
+    def test_rebuild_command(self):
+        PostTerm.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_search_index', batch_size=2, stdout=out)
+        self.assertIn('Проиндексировано постов: 3', out.getvalue())
+        self.assertEqual(
+            self.found('море'), [self.sea.pk, self.beach.pk]
+        )
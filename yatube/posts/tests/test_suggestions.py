@@ -0,0 +1,140 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts import suggestions
+from posts.models import Follow, FollowSuggestion, Group, Post
+
+User = get_user_model()
+
+
+class SparseRowsTests(TestCase):
+    def test_rows_and_limit(self):
+        rows = suggestions.SparseRows([(1, 10), (1, 11), (1, 12), (3, 10)])
+        self.assertEqual(list(rows.row(1)), [10, 11, 12])
+        self.assertEqual(list(rows.row(1, limit=2)), [11, 12])
+        self.assertEqual(list(rows.row(2)), [])
+        self.assertEqual(rows.size(3), 1)
+
+
+class RecommenderTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = {
+            name: User.objects.create_user(username=name)
+            for name in ('reader', 'fan_1', 'fan_2', 'a', 'b', 'c', 'd')
+        }
+        for user, author in (
+            ('reader', 'a'),
+            ('fan_1', 'a'), ('fan_1', 'b'), ('fan_1', 'c'),
+            ('fan_2', 'a'), ('fan_2', 'b'),
+        ):
+            self.follow(user, author)
+        self.tmp = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.state = os.path.join(self.tmp, 'state.json')
+
+    def follow(self, user, author):
+        Follow.objects.create(user=self.users[user], author=self.users[author])
+
+    def suggested(self, name):
+        recommender = suggestions.Recommender()
+        return [
+            User.objects.get(pk=author_id).username
+            for author_id, _ in recommender.suggest(self.users[name].pk)
+        ]
+
+    def recommend(self, **options):
+        call_command(
+            'recommend_follows', state=self.state, stdout=StringIO(),
+            **options
+        )
+
+    def test_co_follows_rank_first(self):
+        """Чаще всего подписанные вместе авторы идут первыми."""
+        self.assertEqual(self.suggested('reader')[:2], ['b', 'c'])
+
+    def test_followed_and_self_are_excluded(self):
+        suggested = self.suggested('fan_1')
+        self.assertNotIn('fan_1', suggested)
+        self.assertFalse({'a', 'b', 'c'} & set(suggested))
+
+    def test_shared_groups_help_cold_start(self):
+        """Без подписок выручают авторы тех же групп."""
+        group = Group.objects.create(title='Г', slug='g', description='')
+        newcomer = User.objects.create_user(username='newcomer')
+        Post.objects.create(author=newcomer, group=group, text='Привет')
+        Post.objects.create(author=self.users['d'], group=group, text='Да')
+        recommender = suggestions.Recommender()
+        self.assertEqual(
+            recommender.suggest(newcomer.pk)[0][0], self.users['d'].pk
+        )
+
+    def test_neighbourhood_matches_whole_graph(self):
+        """Окрестность читателя даёт те же рекомендации, что весь граф."""
+        outsider = User.objects.create_user(username='outsider')
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=outsider, author=other)
+        reader = self.users['reader'].pk
+        whole = suggestions.Recommender()
+        local = suggestions.Recommender(
+            readers=[reader], popular=whole.popular
+        )
+        self.assertEqual(local.suggest(reader), whole.suggest(reader))
+        self.assertNotIn(other.pk, local.followers.offsets)
+        self.assertNotIn(outsider.pk, local.following.offsets)
+
+    def test_incremental_reuses_popular_from_state(self):
+        self.recommend()
+        with open(self.state) as state:
+            self.assertTrue(json.load(state)['popular'])
+        self.follow('reader', 'c')
+        with mock.patch('posts.suggestions.popular_authors') as popular:
+            self.recommend(incremental=True)
+        popular.assert_not_called()
+
+    def test_read_is_one_query_and_skips_new_follows(self):
+        self.recommend()
+        reader = self.users['reader']
+        with self.assertNumQueries(1):
+            authors = suggestions.for_user(reader)
+        self.assertEqual(authors[0], self.users['b'])
+        self.follow('reader', 'b')
+        self.assertNotIn(self.users['b'], suggestions.for_user(reader))
+
+    def test_incremental_touches_changed_readers_only(self):
+        self.recommend()
+        FollowSuggestion.objects.filter(user=self.users['fan_1']).delete()
+        self.follow('reader', 'c')
+        self.recommend(incremental=True)
+        self.assertFalse(
+            FollowSuggestion.objects.filter(user=self.users['fan_1']).exists()
+        )
+        self.assertFalse(FollowSuggestion.objects.filter(
+            user=self.users['reader'], author=self.users['c']
+        ).exists())
+
+    def test_pages_show_suggestions(self):
+        self.recommend()
+        client = Client()
+        client.force_login(self.users['reader'])
+        for url in (
+            reverse('posts:follow_index'),
+            reverse('posts:profile', args=['a']),
+        ):
+            with self.subTest(url=url):
+                response = client.get(url)
+                self.assertEqual(
+                    response.context['suggestions'][0], self.users['b']
+                )
+                self.assertContains(response, 'Кого почитать')
@@ -0,0 +1,244 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from posts import thumbnails
+from posts.models import Post
+from posts.tests.fixtures.fixture_data import SMALL_GIF
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+PLACEHOLDER = 'img/thumbnail_placeholder.svg'
+THUMBNAIL = 'cache/00/thumb.gif'
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailPipelineTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='thumb_user')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост с картинкой',
+            image=SimpleUploadedFile(
+                name='thumb.gif', content=SMALL_GIF, content_type='image/gif'
+            ),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.post.refresh_from_db()
+
+    def test_placeholder_until_thumbnail_is_ready(self):
+        """Пока миниатюры нет, страница показывает заглушку."""
+        with mock.patch('posts.thumbnails.schedule') as schedule:
+            response = self.client.get(
+                reverse('posts:post_detail', args=[self.post.pk])
+            )
+        self.assertContains(response, PLACEHOLDER)
+        schedule.assert_called_once_with(self.post.image.name, self.post.pk)
+
+    def test_render_marks_ready_and_resets_card(self):
+        """После отрисовки картинка готова, а карточка перерисуется."""
+        version = self.post.card_version
+        with mock.patch('posts.thumbnails.get_thumbnail') as get_thumbnail:
+            get_thumbnail.return_value.name = THUMBNAIL
+            thumbnails.schedule(self.post.image.name, self.post.pk)
+        self.assertEqual(
+            get_thumbnail.call_count, len(thumbnails.GEOMETRIES)
+        )
+        self.assertTrue(thumbnails.is_ready(self.post.image.name))
+        self.post.refresh_from_db()
+        self.assertGreater(self.post.card_version, version)
+
+    def test_failed_render_is_not_ready(self):
+        """Ошибка ресайза не помечает картинку готовой."""
+        with mock.patch(
+            'posts.thumbnails.get_thumbnail', side_effect=OSError
+        ), self.assertLogs('posts.thumbnails', 'ERROR'):
+            thumbnails.schedule(self.post.image.name, self.post.pk)
+        self.assertFalse(thumbnails.is_ready(self.post.image.name))
+
+    def test_failed_render_backs_off(self):
+        """После ошибки картинку не декодируют на каждом просмотре."""
+        name = self.post.image.name
+        with mock.patch(
+            'posts.thumbnails.get_thumbnail', side_effect=OSError
+        ) as get_thumbnail, self.assertLogs('posts.thumbnails', 'ERROR'):
+            thumbnails.schedule(name, self.post.pk)
+            thumbnails.schedule(name, self.post.pk)
+            self.assertEqual(get_thumbnail.call_count, 1)
+            # Третья ошибка подряд: пауза вчетверо длиннее первой
+            with mock.patch('posts.thumbnails.cache') as mocked:
+                mocked.add.return_value = False
+                mocked.incr.return_value = 3
+                thumbnails.render(name, self.post.pk)
+        mocked.set.assert_called_once_with(
+            f'thumbnail:pending:{name}', True, 4 * thumbnails.FAILURE_BACKOFF
+        )
+
+    def test_pending_image_is_not_scheduled_twice(self):
+        """Пока задача в очереди, повторная постановка ничего не делает."""
+        with override_settings(THUMBNAIL_WORKERS=1), mock.patch(
+            'posts.thumbnails._get_executor'
+        ) as get_executor:
+            thumbnails.schedule(self.post.image.name, self.post.pk)
+            thumbnails.schedule(self.post.image.name, self.post.pk)
+        get_executor.return_value.submit.assert_called_once()
+
+    def test_feed_resolves_thumbnails_in_one_batch(self):
+        """Лента берёт готовые миниатюры страницы одним get_many."""
+        with mock.patch('posts.thumbnails.get_thumbnail') as get_thumbnail:
+            get_thumbnail.return_value.name = THUMBNAIL
+            thumbnails.render(self.post.image.name, self.post.pk)
+        with mock.patch(
+            'posts.thumbnails.ready_thumbnails'
+        ) as ready_thumbnails:
+            response = self.client.get(reverse('posts:index'))
+        ready_thumbnails.assert_not_called()
+        self.assertContains(response, settings.MEDIA_URL + THUMBNAIL)
+        self.assertNotContains(response, PLACEHOLDER)
+
+    def test_picture_lists_variants_up_to_image_width(self):
+        """srcset в WebP и JPEG без вариантов шире самой картинки."""
+        Post.objects.filter(pk=self.post.pk).update(image_width=1000)
+
+        def get_thumbnail(name, geometry, format, **options):
+            thumbnail = mock.Mock()
+            thumbnail.name = f'cache/{geometry}.{format.lower()}'
+            return thumbnail
+
+        with mock.patch('posts.thumbnails.get_thumbnail', get_thumbnail):
+            thumbnails.render(self.post.image.name, self.post.pk)
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk])
+        )
+        media = settings.MEDIA_URL + 'cache/'
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(
+            response, f'{media}480x170.webp 480w, {media}960x339.webp 960w"'
+        )
+        self.assertContains(
+            response, f'{media}480x170.jpeg 480w, {media}960x339.jpeg 960w"'
+        )
+        self.assertContains(response, f'src="{media}960x339.jpeg"')
+        self.assertNotContains(response, '1440w')
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CleanThumbnailsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='janitor_user')
+        Post.objects.create(
+            author=cls.user, text='Пост', image='posts/used.gif'
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        self.state = os.path.join(TEMP_MEDIA_ROOT, 'state.json')
+        self.used = self.store_source('posts/used.gif', 'cache/aa/used.gif')
+        self.orphan = self.store_source(
+            'posts/deleted.gif', 'cache/bb/orphan.gif'
+        )
+        self.stray = self.write_file('cache/cc/stray.gif')
+
+    def write_file(self, name, age=60 * 60 * 24):
+        name = default.storage.save(name, ContentFile(SMALL_GIF))
+        past = time.time() - age
+        os.utime(default.storage.path(name), (past, past))
+        return name
+
+    def store_source(self, name, thumbnail_name):
+        source = ImageFile(self.write_file(name), default.storage)
+        source.set_size((1, 1))
+        default.kvstore.set(source)
+        thumbnail = ImageFile(
+            self.write_file(thumbnail_name), default.storage
+        )
+        thumbnail.set_size((1, 1))
+        default.kvstore.set(thumbnail, source)
+        return thumbnail.name
+
+    def clean(self, *args):
+        out = StringIO()
+        call_command(
+            'clean_thumbnails', '--rate=0', f'--state={self.state}', *args,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def test_removes_orphans_and_keeps_used(self):
+        """Миниатюры удалённых картинок и бесхозные файлы удаляются."""
+        young = self.write_file('cache/dd/young.gif', age=0)
+        out = self.clean()
+        self.assertIn('Удалено миниатюр: 2', out)
+        self.assertFalse(default.storage.exists(self.orphan))
+        self.assertFalse(default.storage.exists(self.stray))
+        self.assertTrue(default.storage.exists(self.used))
+        self.assertTrue(default.storage.exists(young))
+        self.assertIsNone(
+            default.kvstore.get(ImageFile(self.orphan, default.storage))
+        )
+        self.assertIsNotNone(
+            default.kvstore.get(ImageFile(self.used, default.storage))
+        )
+        self.assertFalse(os.path.exists(self.state))
+
+    def test_dry_run_only_reports(self):
+        """Пробный запуск считает байты и ничего не удаляет."""
+        out = self.clean('--dry-run')
+        self.assertIn('Можно удалить миниатюр: 2', out)
+        self.assertTrue(default.storage.exists(self.orphan))
+        self.assertTrue(default.storage.exists(self.stray))
+
+    def test_dry_run_keeps_saved_position(self):
+        """Пробный запуск обходит всё и не сбрасывает место остановки."""
+        position = {'phase': 'files', 'position': ['cc', 'stray.gif']}
+        with open(self.state, 'w') as state:
+            json.dump(position, state)
+        out = self.clean('--dry-run')
+        self.assertIn('Можно удалить миниатюр: 2', out)
+        with open(self.state) as state:
+            self.assertEqual(json.load(state), position)
+
+    def test_resumes_from_saved_position(self):
+        """Прерванный обход файлов продолжается с сохранённого места."""
+        with open(self.state, 'w') as state:
+            json.dump({'phase': 'files', 'position': ['cc', 'stray.gif']},
+                      state)
+        later = self.write_file('cache/dd/later.gif')
+        out = self.clean()
+        self.assertIn('Удалено миниатюр: 1', out)
+        self.assertTrue(default.storage.exists(self.stray))
+        self.assertFalse(default.storage.exists(later))
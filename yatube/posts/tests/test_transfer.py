@@ -0,0 +1,156 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from posts.models import AuthorStats, Comment, FeedEntry, Follow, Group, Post
+
+User = get_user_model()
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.tmp = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.author = User.objects.create_user(
+            username='transfer_author', first_name='Лев', last_name='Толстой'
+        )
+        self.reader = User.objects.create_user(username='transfer_reader')
+        self.group = Group.objects.create(
+            title='Классики', slug='classics', description='Описание'
+        )
+        self.published = timezone.now() - timedelta(days=30)
+        self.post = Post.objects.create(
+            author=self.author,
+            group=self.group,
+            text='Все счастливые семьи похожи друг на друга',
+            image='posts/family.jpg',
+            image_width=800,
+            image_height=600,
+        )
+        Post.objects.filter(pk=self.post.pk).update(pub_date=self.published)
+        self.comment = Comment.objects.create(
+            post=self.post, author=self.reader, text='Спорно'
+        )
+        Follow.objects.create(user=self.reader, author=self.author)
+
+    def path(self, name):
+        return os.path.join(self.tmp, name)
+
+    def export(self, name, **options):
+        path = self.path(name)
+        call_command('export_posts', path, stderr=StringIO(), **options)
+        return path
+
+    def load(self, path, **options):
+        out = StringIO()
+        call_command('import_posts', path, stdout=out, **options)
+        return out.getvalue()
+
+    def wipe(self):
+        Post.objects.all().delete()
+        Follow.objects.all().delete()
+        User.objects.all().delete()
+        Group.objects.all().delete()
+
+    def test_ndjson_round_trip(self):
+        """Выгрузка и загрузка сохраняют записи, ссылки и даты."""
+        path = self.export('dump.ndjson')
+        self.wipe()
+        out = self.load(path)
+        self.assertIn('post: 1', out)
+        post = Post.objects.select_related('author', 'group').get(
+            pk=self.post.pk
+        )
+        self.assertEqual(post.text, self.post.text)
+        self.assertEqual(post.author.get_full_name(), 'Лев Толстой')
+        self.assertEqual(post.group.slug, 'classics')
+        self.assertEqual(post.pub_date, self.published)
+        self.assertEqual(post.image.name, 'posts/family.jpg')
+        self.assertEqual(post.image_width, 800)
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(
+            AuthorStats.objects.get(author=post.author).post_count, 1
+        )
+        reader = User.objects.get(username='transfer_reader')
+        self.assertFalse(reader.has_usable_password())
+        self.assertTrue(
+            FeedEntry.objects.filter(user=reader, post=post).exists()
+        )
+
+    def test_import_is_idempotent(self):
+        """Повторный импорт того же файла ничего не дублирует."""
+        path = self.export('dump.ndjson')
+        self.load(path)
+        self.load(path)
+        self.assertEqual(Post.objects.count(), 1)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+
+    def test_repeated_import_reports_nothing_imported(self):
+        """В отчёт попадают только действительно вставленные строки."""
+        path = self.export('dump.ndjson')
+        out = self.load(path)
+        self.assertNotIn('post:', out)
+        self.assertIn('Пропущено записей: 6', out)
+
+    def test_taken_post_id_stops_import(self):
+        """Чужой пост с тем же id не теряется молча, а останавливает импорт."""
+        path = self.export('posts.csv', kind=['post'])
+        Post.objects.filter(pk=self.post.pk).update(text='Другой пост')
+        with self.assertRaises(CommandError):
+            self.load(path, kind='post')
+        self.assertEqual(Post.objects.get().text, 'Другой пост')
+
+    def test_csv_creates_missing_authors(self):
+        path = self.export('posts.csv', kind=['post'])
+        self.wipe()
+        self.load(path, kind='post')
+        post = Post.objects.get()
+        self.assertEqual(post.author.username, 'transfer_author')
+        self.assertEqual(post.group.slug, 'classics')
+
+    def test_imported_posts_reach_existing_follows(self):
+        """Посты, загруженные без подписок, попадают в ленты подписчиков."""
+        path = self.export('posts.csv', kind=['post'])
+        Post.objects.all().delete()
+        self.assertFalse(FeedEntry.objects.exists())
+        self.load(path, kind='post')
+        self.assertTrue(FeedEntry.objects.filter(
+            user=self.reader, post=self.post.pk
+        ).exists())
+
+    def test_csv_needs_single_kind(self):
+        with self.assertRaises(CommandError):
+            self.export('dump.csv')
+        with self.assertRaises(CommandError):
+            self.load(self.path('dump.csv'))
+
+    def test_orphan_comments_are_skipped(self):
+        path = self.path('comments.ndjson')
+        with open(path, 'w') as stream:
+            for post_id in (self.post.pk, self.post.pk + 100):
+                stream.write(json.dumps({
+                    'type': 'comment', 'post': post_id,
+                    'author': 'transfer_reader', 'text': 'Ещё',
+                }) + '\n')
+        out = self.load(path)
+        self.assertIn('Пропущено записей: 1', out)
+        self.assertEqual(self.post.comments.count(), 2)
+
+    def test_broken_line_is_reported(self):
+        path = self.path('broken.ndjson')
+        with open(path, 'w') as stream:
+            stream.write('{"type": "post"\n')
+        with self.assertRaises(CommandError):
+            self.load(path)
@@ -0,0 +1,152 @@
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import trending
+from posts.models import (ActivityBucket, Comment, Follow, Group, Post,
+                          TrendingList)
+
+User = get_user_model()
+
+
+class TrendingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='trend_author')
+        self.reader = User.objects.create_user(username='trend_reader')
+        self.group = Group.objects.create(
+            title='Тренды', slug='trends', description='Описание'
+        )
+        self.hot = Post.objects.create(
+            author=self.author, group=self.group, text='Горячий пост'
+        )
+        self.cold = Post.objects.create(
+            author=self.reader, group=self.group, text='Старый пост'
+        )
+        self.tmp = tempfile.mkdtemp(dir=settings.BASE_DIR)
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.state = os.path.join(self.tmp, 'state.json')
+
+    def aggregate(self):
+        call_command(
+            'aggregate_trending', state=self.state, stdout=StringIO()
+        )
+
+    def comment(self, post, hours_ago=0):
+        comment = Comment.objects.create(
+            post=post, author=self.reader, text='Комментарий'
+        )
+        if hours_ago:
+            Comment.objects.filter(pk=comment.pk).update(
+                created=timezone.now() - timedelta(hours=hours_ago)
+            )
+
+    def test_buckets_count_comments_and_follows(self):
+        """Подписчик засчитывается последнему посту автора."""
+        self.comment(self.hot)
+        self.comment(self.hot)
+        Follow.objects.create(user=self.reader, author=self.author)
+        trending.aggregate()
+        bucket = ActivityBucket.objects.get(post=self.hot)
+        self.assertEqual((bucket.comments, bucket.follows), (2, 1))
+
+    def test_aggregate_is_idempotent(self):
+        self.comment(self.hot)
+        trending.aggregate()
+        trending.aggregate()
+        self.assertEqual(ActivityBucket.objects.get().comments, 1)
+
+    def test_incremental_run_keeps_earlier_hours(self):
+        self.comment(self.cold, hours_ago=5)
+        self.aggregate()
+        self.comment(self.hot)
+        self.aggregate()
+        self.assertEqual(ActivityBucket.objects.count(), 2)
+
+    def test_watermark_is_kept_in_state_file(self):
+        """Повторный запуск пересчитывает только часы с прошлого."""
+        self.comment(self.cold, hours_ago=5)
+        self.aggregate()
+        # Корзину старого часа второй запуск уже не собирает заново
+        ActivityBucket.objects.update(comments=7)
+        cache.clear()
+        self.aggregate()
+        self.assertEqual(ActivityBucket.objects.get().comments, 7)
+
+    def test_old_buckets_are_pruned(self):
+        ActivityBucket.objects.create(
+            post=self.cold,
+            hour=timezone.now() - trending.WINDOW - timedelta(hours=2),
+            comments=100,
+        )
+        trending.aggregate()
+        self.assertFalse(ActivityBucket.objects.exists())
+
+    def test_recent_activity_outranks_older(self):
+        """Затухание: свежий комментарий важнее трёх вчерашних."""
+        for _ in range(3):
+            self.comment(self.cold, hours_ago=24)
+        self.comment(self.hot)
+        trending.aggregate()
+        trending.refresh()
+        self.assertEqual(
+            trending.trending_posts(), [self.hot, self.cold]
+        )
+        self.assertEqual(trending.trending_groups(), [self.group])
+
+    def test_lists_are_read_from_cache(self):
+        self.comment(self.hot)
+        self.aggregate()
+        trending.trending_posts(self.group.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(
+                trending.trending_posts(self.group.pk), [self.hot]
+            )
+
+    def test_lists_survive_without_shared_cache(self):
+        """Воркер с пустым кэшем читает списки из TrendingList."""
+        self.comment(self.hot)
+        self.aggregate()
+        self.assertTrue(TrendingList.objects.exists())
+        cache.clear()
+        self.assertEqual(trending.trending_posts(), [self.hot])
+        self.assertEqual(trending.trending_groups(), [self.group])
+        self.assertIsNotNone(trending.refreshed_at())
+
+    def test_no_lists_before_first_refresh(self):
+        self.assertEqual(trending.trending_posts(), [])
+        self.assertIsNone(trending.refreshed_at())
+
+    def test_pages_render_trending(self):
+        self.comment(self.hot)
+        self.aggregate()
+        client = Client()
+        response = client.get(reverse('posts:trending'))
+        self.assertEqual(response.context['posts'], [self.hot])
+        group_url = reverse('posts:group_list', args=[self.group.slug])
+        response = client.get(group_url)
+        self.assertEqual(response.context['trending'], [self.hot])
+        self.assertContains(response, 'Обсуждают сейчас')
+
+    @override_settings(CACHE_SHARED=True)
+    def test_refresh_changes_group_etag(self):
+        url = reverse('posts:group_list', args=[self.group.slug])
+        client = Client()
+        etag = client.get(url)['ETag']
+        self.assertEqual(
+            client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        trending.refresh()
+        self.assertEqual(
+            client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
@@ -1,5 +1,6 @@
 import shutil
 import tempfile
+from unittest import mock
 
 from django import forms
 from django.conf import settings
@@ -7,7 +8,12 @@ from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from django.utils.cache import get_cache_key
 
+from posts.caching import (HIT, INDEX_GENERATION_KEY, MISS, REGENERATE,
+                           STALE, cache_metrics, flush_metrics,
+                           get_generation)
+from posts import views
 from posts.models import Comment, Follow, Group, Post
 from posts.tests.fixtures.fixture_data import test_picture
 
@@ -236,15 +242,16 @@ class PaginatorViewsTest(TestCase):
             slug='test_group',
             description='testtest',
         )
-        cls.follow = Follow.objects.create(
-            user=cls.user_two,
-            author=cls.user,
-        )
         post_list = [Post(
             author=PaginatorViewsTest.user,
             text=f'Тестовый текст {i}',
             group=PaginatorViewsTest.group,) for i in range(0, 13)]
         Post.objects.bulk_create(post_list)
+        # bulk_create не шлёт сигналов: ленту наполнит подписка
+        cls.follow = Follow.objects.create(
+            user=cls.user_two,
+            author=cls.user,
+        )
         cls.paginator_test_page_urls = (
             (reverse('posts:index')),
             (reverse('posts:follow_index')),
@@ -289,6 +296,9 @@ class CacheTests(TestCase):
         )
 
     def setUp(self):
+        # Счётчики прошлых тестов копятся в памяти процесса
+        flush_metrics()
+        cache.clear()
         self.guest_client = Client()
 
     def test_cache_works_index_page(self):
@@ -303,12 +313,70 @@ class CacheTests(TestCase):
         self.assertNotEqual(response.context, new_response.context)
 
     def test_cache_works_index_page_after_post_delete(self):
-        """Кэширование страницы index после удаления поста."""
+        """Удаление поста сразу сбрасывает кэш страницы index."""
         response = self.guest_client.get(reverse('posts:index'))
         Post.objects.filter(pk=CacheTests.post.pk).delete()
         new_response = self.guest_client.get(reverse('posts:index'))
+        self.assertNotEqual(response.content, new_response.content)
+        self.assertNotContains(new_response, CacheTests.post.text)
+
+    def test_index_page_served_from_cache(self):
+        """Без изменений в данных index отдаётся из кэша."""
+        self.guest_client.get(reverse('posts:index'))
+        with self.assertNumQueries(0):
+            self.guest_client.get(reverse('posts:index'))
+
+    def test_login_does_not_reset_index_cache(self):
+        """Вход пользователя не сбрасывает кэш index."""
+        response = self.guest_client.get(reverse('posts:index'))
+        Post.objects.filter(pk=CacheTests.post.pk).update(text='Мимо кэша')
+        CacheTests.user.save(update_fields=['last_login'])
+        new_response = self.guest_client.get(reverse('posts:index'))
         self.assertEqual(response.content, new_response.content)
 
+    def test_cold_page_is_built_once(self):
+        """Пока один воркер строит страницу, другие ждут его результат."""
+        url = reverse('posts:index')
+        prefix = f'index_page.{get_generation(INDEX_GENERATION_KEY)}'
+        built = self.guest_client.get(url)
+        page_key = get_cache_key(built.wsgi_request, prefix, 'GET', cache)
+        cached = cache.get(page_key)
+        cache.delete(page_key)
+        # Страницу строит «другой воркер»: блокировка занята,
+        # а его результат появляется в кэше, пока мы ждём
+        cache.set(f'{prefix}.lock.{url}', True)
+        with mock.patch(
+            'posts.caching.time.sleep',
+            side_effect=lambda seconds: cache.set(page_key, cached),
+        ):
+            with self.assertNumQueries(0):
+                response = self.guest_client.get(url)
+        self.assertEqual(response.content, built.content)
+
+    def test_expired_page_served_stale_while_rebuilding(self):
+        """Просроченную страницу отдаём, пока её перестраивает другой."""
+        url = reverse('posts:index')
+        prefix = f'index_page.{get_generation(INDEX_GENERATION_KEY)}'
+        built = self.guest_client.get(url)
+        page_key = get_cache_key(built.wsgi_request, prefix, 'GET', cache)
+        _, expires_at, _ = cache.get(page_key)
+        cache.set(f'{prefix}.lock.{url}', True, None)
+        # Срок вышел и у записи, и у ключа со списком заголовков
+        later = mock.patch('time.time', return_value=expires_at + 1)
+        with later, self.assertNumQueries(0):
+            stale = self.guest_client.get(url)
+        self.assertEqual(stale.content, built.content)
+        self.assertEqual(cache_metrics('index_page')[STALE], 1)
+
+    def test_cache_metrics(self):
+        """Промахи, попадания и перестроения считаются."""
+        self.guest_client.get(reverse('posts:index'))
+        self.guest_client.get(reverse('posts:index'))
+        metrics = cache_metrics('index_page')
+        self.assertEqual(metrics[MISS], 1)
+        self.assertEqual(metrics[REGENERATE], 1)
+        self.assertEqual(metrics[HIT], 1)
+
 
 class Follow_system_Tests(TestCase):
     @classmethod
@@ -381,3 +449,304 @@ class Follow_system_Tests(TestCase):
         )
         self.assertIn('page_obj', response.context)
         self.assertEqual(len(response.context['page_obj']), 0)
+
+
+class CursorPaginatorTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='cursor_user')
+        Post.objects.bulk_create([Post(
+            author=cls.user,
+            text=f'Курсорный пост {i}',) for i in range(25)])
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+
+    def test_cursor_pages_do_not_overlap(self):
+        """Курсоры проходят ленту без пропусков и повторов."""
+        seen = []
+        cursor = ''
+        while cursor is not None:
+            response = self.guest_client.get(
+                reverse('posts:index'), {'cursor': cursor}
+            )
+            page_obj = response.context['page_obj']
+            self.assertTrue(page_obj.is_cursor)
+            seen.extend(post.pk for post in page_obj)
+            cursor = page_obj.next_cursor
+        expected = list(
+            Post.objects.order_by('-pub_date', '-pk')
+            .values_list('pk', flat=True)
+        )
+        self.assertEqual(seen, expected)
+
+    def test_cursor_previous_returns_to_first_page(self):
+        """Ссылка «Предыдущая» возвращает на предыдущую страницу."""
+        url = reverse('posts:profile', kwargs={'username': 'cursor_user'})
+        first = self.guest_client.get(url, {'cursor': ''})
+        second = self.guest_client.get(
+            url, {'cursor': first.context['page_obj'].next_cursor}
+        )
+        back = self.guest_client.get(
+            url, {'cursor': second.context['page_obj'].previous_cursor}
+        )
+        self.assertEqual(
+            list(first.context['page_obj']),
+            list(back.context['page_obj']),
+        )
+        self.assertFalse(first.context['page_obj'].has_previous())
+        self.assertContains(
+            second, f'?cursor={second.context["page_obj"].next_cursor}'
+        )
+
+    def test_broken_cursor_shows_first_page(self):
+        """Битый курсор не ломает страницу, а отдаёт начало ленты."""
+        response = self.guest_client.get(
+            reverse('posts:index'), {'cursor': '%%%'}
+        )
+        self.assertEqual(len(response.context['page_obj']), 10)
+
+
+class PostCardCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='card_author')
+        cls.group = Group.objects.create(
+            title='Группа карточек',
+            slug='cards',
+            description='Описание',
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.post = Post.objects.create(
+            author=PostCardCacheTests.user,
+            text='Исходный текст',
+            group=PostCardCacheTests.group,
+        )
+        self.authorized_client = Client()
+        self.authorized_client.force_login(PostCardCacheTests.user)
+        self.profile_url = reverse(
+            'posts:profile', kwargs={'username': self.user.username}
+        )
+
+    def test_post_edit_refreshes_card(self):
+        """После редактирования карточка перерисовывается."""
+        self.authorized_client.get(self.profile_url)
+        self.authorized_client.post(
+            reverse('posts:post_edit', kwargs={'post_id': self.post.pk}),
+            {'text': 'Новый текст', 'group': self.group.pk},
+        )
+        response = self.authorized_client.get(self.profile_url)
+        self.assertContains(response, 'Новый текст')
+        self.assertNotContains(response, 'Исходный текст')
+
+    def test_group_and_author_changes_refresh_cards(self):
+        """Переименование группы и автора сбрасывает карточки."""
+        self.authorized_client.get(self.profile_url)
+        self.group.title = 'Новое имя группы'
+        self.group.save()
+        self.user.first_name = 'Иван'
+        self.user.save()
+        response = self.authorized_client.get(self.profile_url)
+        self.assertContains(response, 'Новое имя группы')
+        self.assertContains(response, 'Иван')
+
+    def test_cached_card_is_shared_between_feeds(self):
+        """Карточка из кэша не трогает базу на другой ленте."""
+        self.authorized_client.get(self.profile_url)
+        Post.objects.filter(pk=self.post.pk).update(text='Мимо кэша')
+        response = self.authorized_client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        )
+        self.assertContains(response, 'Исходный текст')
+
+
+class PostDetailQueriesTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='commenter')
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост с комментариями',
+        )
+        cls.url = reverse('posts:post_detail', kwargs={'post_id': cls.post.pk})
+
+    def setUp(self):
+        self.guest_client = Client()
+
+    def add_comments(self, count):
+        User.objects.bulk_create([
+            User(username=f'reader_{i}') for i in range(count)
+        ])
+        users = User.objects.filter(username__startswith='reader_')
+        Comment.objects.bulk_create([
+            Comment(post=self.post, author=user, text=f'Комментарий {i}')
+            for i, user in enumerate(users.order_by('pk'))
+        ])
+
+    def test_post_detail_queries_do_not_grow_with_comments(self):
+        """Число запросов post_detail не зависит от числа комментариев."""
+        self.add_comments(500)
+        self.guest_client.get(self.url)
+        with self.assertNumQueries(3):
+            response = self.guest_client.get(self.url)
+        self.assertEqual(
+            len(response.context['comments']), views.COMMENTS_PER_PAGE
+        )
+
+    def test_comments_are_paginated_in_order(self):
+        """Комментарии идут по порядку и делятся на страницы."""
+        self.add_comments(views.COMMENTS_PER_PAGE + 1)
+        response = self.guest_client.get(self.url, {'comments_page': 2})
+        comments = response.context['comments']
+        self.assertEqual(len(comments), 1)
+        self.assertEqual(
+            comments[0].text, f'Комментарий {views.COMMENTS_PER_PAGE}'
+        )
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='etag_author')
+        cls.reader = User.objects.create_user(username='etag_reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='etag_group', description='Описание'
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Пост'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.guest_client = Client()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def revalidate(self, client, url):
+        etag = client.get(url)['ETag']
+        return etag, client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_return_304(self):
+        """Неизменившиеся страницы отдаются ответом 304 без шаблона.
+
+        Лента сверяется с поколением кэша, профиль — с версией в
+        AuthorStats, пост — с версией своей карточки.
+        """
+        urls = (
+            (reverse('posts:index'), 0),
+            (reverse('posts:profile', args=[self.author.username]), 1),
+            (reverse('posts:post_detail', args=[self.post.pk]), 1),
+        )
+        for url, queries in urls:
+            with self.subTest(url=url), self.settings(CACHE_SHARED=True):
+                first = self.guest_client.get(url)
+                self.assertTrue(first.has_header('Last-Modified'))
+                with self.assertNumQueries(queries):
+                    response = self.guest_client.get(
+                        url, HTTP_IF_NONE_MATCH=first['ETag']
+                    )
+                self.assertEqual(response.status_code, 304)
+                self.assertFalse(response.templates)
+
+    def test_feeds_have_no_validators_without_shared_cache(self):
+        """С LocMemCache поколение у каждого воркера своё: 304 не даём."""
+        urls = (
+            reverse('posts:index'),
+            reverse('posts:group_list', args=[self.group.slug]),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.guest_client.get(url)
+                self.assertFalse(response.has_header('ETag'))
+                self.assertFalse(response.has_header('Last-Modified'))
+
+    def test_new_comment_changes_etag(self):
+        """Новый комментарий меняет ETag страницы поста."""
+        url = reverse('posts:post_detail', args=[self.post.pk])
+        etag, _ = self.revalidate(self.guest_client, url)
+        Comment.objects.create(post=self.post, author=self.reader, text='!')
+        response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_unrelated_post_keeps_etags(self):
+        """Чужой пост не сбрасывает ETag профиля и страницы поста."""
+        urls = (
+            reverse('posts:profile', args=[self.author.username]),
+            reverse('posts:post_detail', args=[self.post.pk]),
+        )
+        etags = [self.guest_client.get(url)['ETag'] for url in urls]
+        Post.objects.create(author=self.reader, text='Чужой пост')
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_edit_and_new_post_change_author_etags(self):
+        """Правка поста и новый пост автора меняют ETag его страниц."""
+        profile_url = reverse('posts:profile', args=[self.author.username])
+        post_url = reverse('posts:post_detail', args=[self.post.pk])
+        profile_etag, _ = self.revalidate(self.guest_client, profile_url)
+        post_etag, _ = self.revalidate(self.guest_client, post_url)
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        for url, etag in ((profile_url, profile_etag), (post_url, post_etag)):
+            with self.subTest(url=url):
+                response = self.guest_client.get(
+                    url, HTTP_IF_NONE_MATCH=etag
+                )
+                self.assertEqual(response.status_code, 200)
+        profile_etag, _ = self.revalidate(self.guest_client, profile_url)
+        Post.objects.create(author=self.author, text='Ещё пост')
+        response = self.guest_client.get(
+            profile_url, HTTP_IF_NONE_MATCH=profile_etag
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_comment_and_renames_change_profile_etag(self):
+        """Версию профиля сдвигают комментарий и переименования."""
+        url = reverse('posts:profile', args=[self.author.username])
+        changes = (
+            lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='!'
+            ),
+            lambda: Group.objects.filter(pk=self.group.pk).first().save(),
+            lambda: User.objects.get(pk=self.author.pk).save(
+                update_fields=['first_name']
+            ),
+        )
+        for change in changes:
+            etag, _ = self.revalidate(self.guest_client, url)
+            change()
+            response = self.guest_client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+    def test_profile_revalidation_does_not_scan_posts(self):
+        """Проверка ETag профиля не обходит посты автора."""
+        url = reverse('posts:profile', args=[self.author.username])
+        etag = self.reader_client.get(url)['ETag']
+        # Сессия и пользователь, автор со статистикой, рекомендации,
+        # подписка — без агрегатов по постам автора
+        with self.assertNumQueries(5):
+            response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_etag_depends_on_user_and_follow(self):
+        """ETag профиля свой у каждого читателя и меняется с подпиской."""
+        url = reverse('posts:profile', args=[self.author.username])
+        guest_etag, _ = self.revalidate(self.guest_client, url)
+        etag, response = self.revalidate(self.reader_client, url)
+        self.assertNotEqual(etag, guest_etag)
+        self.assertEqual(response.status_code, 304)
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
@@ -0,0 +1,200 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import F
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.images import ImageFile
+
+from .caching import INDEX_GENERATION_KEY, bump_generation
+from .counters import touch_authors
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Ширины вариантов Post.image для srcset; пропорции карточки 960x339
+VARIANT_WIDTHS = (480, 960, 1440)
+DEFAULT_WIDTH = 960
+# Первый формат — основной, последний — запасной для старых браузеров
+VARIANT_FORMATS = ('WEBP', 'JPEG')
+VARIANT_OPTIONS = {'crop': 'center', 'upscale': True}
+
+
+def variant_geometry(width):
+    return f'{width}x{round(width * 339 / 960)}'
+
+
+# Все размеры, в которых шаблоны показывают Post.image
+GEOMETRIES = tuple(
+    (variant_geometry(width), dict(VARIANT_OPTIONS, format=image_format))
+    for width in VARIANT_WIDTHS
+    for image_format in VARIANT_FORMATS
+)
+PENDING_TIMEOUT = 60 * 5
+# После ошибки картинку не перерисовываем FAILURE_BACKOFF секунд,
+# и с каждой новой ошибкой вдвое дольше, но не дольше FAILURE_BACKOFF_MAX
+FAILURE_BACKOFF = 60
+FAILURE_BACKOFF_MAX = 60 * 60 * 6
+FAILURES_TIMEOUT = 60 * 60 * 24
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _ready_key(name):
+    return f'thumbnail:files:{name}'
+
+
+def _pending_key(name):
+    return f'thumbnail:pending:{name}'
+
+
+def _failures_key(name):
+    return f'thumbnail:failures:{name}'
+
+
+def geometry_key(geometry, options):
+    """Ключ размера: одинаковый для шаблонного тега и воркера."""
+    return ' '.join([geometry] + [
+        f'{option}={value}' for option, value in sorted(options.items())
+    ])
+
+
+def is_ready(name):
+    return cache.get(_ready_key(name)) is not None
+
+
+def forget(name):
+    cache.delete(_ready_key(name))
+
+
+def ready_thumbnails(name):
+    """Имена готовых миниатюр по ключам размеров или None."""
+    return cache.get(_ready_key(name))
+
+
+def is_complete(ready):
+    """Нарисованы ли все варианты: старые записи могут быть неполными."""
+    return ready is not None and all(
+        geometry_key(geometry, options) in ready
+        for geometry, options in GEOMETRIES
+    )
+
+
+def srcsets(ready, image_width=None):
+    """Строки srcset по форматам и адрес запасной картинки.
+
+    Ширины больше исходной картинки в srcset не попадают: растянутый
+    вариант весит больше, а выглядит не лучше.
+    """
+    widths = [
+        width for width in VARIANT_WIDTHS
+        if image_width is None or width <= image_width
+    ] or VARIANT_WIDTHS[:1]
+    result = {}
+    for image_format in VARIANT_FORMATS:
+        result[image_format] = ', '.join(
+            f'{_variant_url(ready, width, image_format)} {width}w'
+            for width in widths
+        )
+    fallback = _variant_url(
+        ready, min(DEFAULT_WIDTH, widths[-1]), VARIANT_FORMATS[-1]
+    )
+    return result, fallback
+
+
+def _variant_url(ready, width, image_format):
+    key = geometry_key(
+        variant_geometry(width), dict(VARIANT_OPTIONS, format=image_format)
+    )
+    return thumbnail_file(ready[key]).url
+
+
+def prefetch(posts):
+    """Одним get_many находит готовые миниатюры для страницы ленты.
+
+    Результат кладётся в post.ready_thumbnails, и шаблонный тег
+    ready_thumbnail не ходит в кэш за каждой картинкой.
+    """
+    posts = [post for post in posts if post.image]
+    found = cache.get_many({_ready_key(post.image.name) for post in posts})
+    for post in posts:
+        post.ready_thumbnails = found.get(_ready_key(post.image.name))
+
+
+def thumbnail_file(name):
+    """Готовая миниатюра без обращения к KV-хранилищу sorl."""
+    return ImageFile(name, default.storage)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def schedule(name, post_id):
+    """Ставит картинку в очередь на отрисовку всех миниатюр.
+
+    Повторные вызовы, пока задача не выполнена или после ошибки
+    не вышла пауза (см. render), ничего не делают.
+    """
+    if not cache.add(_pending_key(name), True, PENDING_TIMEOUT):
+        return
+    if not settings.THUMBNAIL_WORKERS:
+        render(name, post_id)
+        return
+    _get_executor().submit(_render_in_worker, name, post_id)
+
+
+def _render_in_worker(name, post_id):
+    try:
+        render(name, post_id)
+    finally:
+        connections.close_all()
+
+
+def render(name, post_id):
+    """Рисует миниатюры и сбрасывает кэш карточки с заглушкой.
+
+    При ошибке отметка о задаче остаётся в кэше на время паузы,
+    чтобы каждый просмотр страницы не декодировал битую картинку снова.
+    """
+    try:
+        ready = {
+            geometry_key(geometry, options):
+                get_thumbnail(name, geometry, **options).name
+            for geometry, options in GEOMETRIES
+        }
+    except Exception:
+        logger.exception('Не удалось нарисовать миниатюры для %s', name)
+        _back_off(name)
+        return
+    try:
+        cache.set(_ready_key(name), ready, None)
+        posts = Post.objects.filter(pk=post_id)
+        posts.update(card_version=F('card_version') + 1)
+        touch_authors(posts.values('author'))
+        bump_generation(INDEX_GENERATION_KEY)
+    finally:
+        cache.delete_many([_pending_key(name), _failures_key(name)])
+
+
+def _back_off(name):
+    key = _failures_key(name)
+    failures = 1
+    if not cache.add(key, failures, FAILURES_TIMEOUT):
+        try:
+            failures = cache.incr(key)
+        except ValueError:
+            cache.add(key, failures, FAILURES_TIMEOUT)
+    delay = min(FAILURE_BACKOFF * 2 ** (failures - 1), FAILURE_BACKOFF_MAX)
+    cache.set(_pending_key(name), True, delay)
@@ -0,0 +1,357 @@
+import csv
+import json
+from contextlib import contextmanager
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+# Порядок важен: записи ссылаются только на стоящие раньше
+KINDS = ('user', 'group', 'post', 'comment', 'follow')
+FIELDS = {
+    'user': ('username', 'first_name', 'last_name'),
+    'group': ('slug', 'title', 'description'),
+    'post': (
+        'id', 'author', 'group', 'text', 'pub_date',
+        'image', 'image_width', 'image_height',
+    ),
+    'comment': ('id', 'post', 'author', 'text', 'created'),
+    'follow': ('user', 'author', 'created'),
+}
+# Пользователи и группы выгружаются по естественным ключам,
+# посты — со своими id, чтобы не сломались ссылки на них
+EXPORT_QUERIES = {
+    'user': lambda: User.objects.order_by('pk').values_list(
+        'username', 'first_name', 'last_name'
+    ),
+    'group': lambda: Group.objects.order_by('pk').values_list(
+        'slug', 'title', 'description'
+    ),
+    'post': lambda: Post.objects.order_by('pk').values_list(
+        'pk', 'author__username', 'group__slug', 'text', 'pub_date',
+        'image', 'image_width', 'image_height',
+    ),
+    'comment': lambda: Comment.objects.order_by('pk').values_list(
+        'pk', 'post_id', 'author__username', 'text', 'created'
+    ),
+    'follow': lambda: Follow.objects.order_by('pk').values_list(
+        'user__username', 'author__username', 'created'
+    ),
+}
+TIMESTAMPS = (
+    (Post, 'pub_date'),
+    (Comment, 'created'),
+    (Follow, 'created'),
+)
+
+
+def export_rows(kind, chunk_size):
+    """Записи одного вида словарями, без загрузки таблицы в память."""
+    rows = EXPORT_QUERIES[kind]().iterator(chunk_size=chunk_size)
+    for values in rows:
+        yield {
+            field: value.isoformat() if hasattr(value, 'isoformat') else value
+            for field, value in zip(FIELDS[kind], values)
+        }
+
+
+class NDJSONWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, kind, row):
+        self.stream.write(
+            json.dumps({'type': kind, **row}, ensure_ascii=False) + '\n'
+        )
+
+
+class CSVWriter:
+    """CSV без поля type: в одном файле записи одного вида."""
+
+    def __init__(self, stream, kind):
+        self.writer = csv.DictWriter(stream, FIELDS[kind])
+        self.writer.writeheader()
+
+    def write(self, kind, row):
+        self.writer.writerow(row)
+
+
+def read_ndjson(stream):
+    for number, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            kind = row.pop('type')
+        except (ValueError, KeyError, AttributeError):
+            raise ValueError(f'Строка {number}: не запись NDJSON')
+        if kind not in FIELDS:
+            raise ValueError(f'Строка {number}: неизвестный вид {kind!r}')
+        yield kind, row
+
+
+def read_csv(stream, kind):
+    for row in csv.DictReader(stream):
+        # В CSV пустая строка — это и пустое значение, и NULL
+        yield kind, {
+            field: value if value != '' else None
+            for field, value in row.items()
+        }
+
+
+def _integer(value):
+    return int(value) if value not in (None, '') else None
+
+
+def _datetime(value):
+    return (parse_datetime(value) if value else None) or timezone.now()
+
+
+@contextmanager
+def preserve_timestamps():
+    """Отключает auto_now_add, чтобы импорт сохранил исходные даты.
+
+    Иначе bulk_create проставит всем записям текущее время, и его
+    пришлось бы исправлять вторым проходом по таблице.
+    """
+    fields = [model._meta.get_field(name) for model, name in TIMESTAMPS]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _fresh(rows, key, existing):
+    """Строки, которых ещё нет в базе, без повторов внутри пачки.
+
+    Строки без ключа (например, пост без id) новые всегда.
+    """
+    seen = set(existing)
+    for row in rows:
+        value = key(row)
+        if value is None or value not in seen:
+            seen.add(value)
+            yield row
+
+
+def _check_same(kind, existing, incoming):
+    """Занятый id должен принадлежать той же записи, а не другой.
+
+    Иначе bulk_create с ignore_conflicts молча потерял бы запись,
+    а комментарии к ней достались бы чужому посту.
+    """
+    for pk, identity in incoming:
+        if pk in existing and existing[pk] != identity:
+            raise ValueError(
+                f'{kind} с id {pk} уже есть в базе, и это другая запись'
+            )
+
+
+class Importer:
+    """Пишет поток записей в базу пачками bulk_create.
+
+    Записи копятся в пачку одного вида; пачка уходит в базу, когда
+    заполнилась или сменился вид записей, каждая — в своей
+    транзакции. Уже существующие строки пропускаются, так что
+    прерванный импорт можно просто запустить заново. Посты
+    и комментарии сохраняют свои id; если id занят другой записью,
+    импорт останавливается с ошибкой.
+    """
+
+    def __init__(self, batch_size):
+        self.batch_size = batch_size
+        self.kind = None
+        self.rows = []
+        self.imported = dict.fromkeys(KINDS, 0)
+        self.skipped = 0
+        self.group_ids = set()
+        # Авторы, чьи ленты подписчиков надо дозаполнить в конце импорта
+        self.author_ids = set()
+
+    def add(self, kind, row):
+        if kind != self.kind:
+            self.flush()
+            self.kind = kind
+        self.rows.append(row)
+        if len(self.rows) == self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Пишет пачку; в отчёт идут только действительно вставленные."""
+        if not self.rows:
+            return
+        with transaction.atomic():
+            inserted = getattr(self, f'import_{self.kind}s')(self.rows)
+        self.imported[self.kind] += inserted
+        self.skipped += len(self.rows) - inserted
+        self.rows = []
+
+    def user_ids(self, usernames):
+        """id пользователей по именам; недостающие заводятся без пароля."""
+        usernames = set(usernames) - {None}
+        found = dict(User.objects.filter(
+            username__in=usernames
+        ).values_list('username', 'pk'))
+        missing = usernames - found.keys()
+        if missing:
+            User.objects.bulk_create([
+                User(username=username, password=make_password(None))
+                for username in missing
+            ], ignore_conflicts=True)
+            found.update(User.objects.filter(
+                username__in=missing
+            ).values_list('username', 'pk'))
+        return found
+
+    def group_ids_by_slug(self, slugs):
+        slugs = set(slugs) - {None}
+        found = dict(
+            Group.objects.filter(slug__in=slugs).values_list('slug', 'pk')
+        )
+        missing = slugs - found.keys()
+        if missing:
+            Group.objects.bulk_create([
+                Group(slug=slug, title=slug, description='')
+                for slug in missing
+            ], ignore_conflicts=True)
+            found.update(
+                Group.objects.filter(slug__in=missing)
+                .values_list('slug', 'pk')
+            )
+        return found
+
+    def import_users(self, rows):
+        existing = User.objects.filter(
+            username__in=[row['username'] for row in rows]
+        ).values_list('username', flat=True)
+        users = [
+            User(
+                username=row['username'],
+                first_name=row.get('first_name') or '',
+                last_name=row.get('last_name') or '',
+                password=make_password(None),
+            )
+            for row in _fresh(rows, lambda row: row['username'], existing)
+        ]
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        return len(users)
+
+    def import_groups(self, rows):
+        existing = Group.objects.filter(
+            slug__in=[row['slug'] for row in rows]
+        ).values_list('slug', flat=True)
+        groups = [
+            Group(
+                slug=row['slug'],
+                title=row.get('title') or row['slug'],
+                description=row.get('description') or '',
+            )
+            for row in _fresh(rows, lambda row: row['slug'], existing)
+        ]
+        Group.objects.bulk_create(groups, ignore_conflicts=True)
+        return len(groups)
+
+    def import_posts(self, rows):
+        """Картинки переносятся ссылкой: файл должен уже лежать в MEDIA."""
+        authors = self.user_ids(row['author'] for row in rows)
+        groups = self.group_ids_by_slug(row.get('group') for row in rows)
+        self.group_ids.update(groups.values())
+        self.author_ids.update(authors.values())
+        existing = {
+            pk: (author_id, text)
+            for pk, author_id, text in Post.objects.filter(
+                pk__in=[_integer(row.get('id')) for row in rows]
+            ).values_list('pk', 'author_id', 'text')
+        }
+        _check_same('Пост', existing, (
+            (_integer(row.get('id')), (authors[row['author']], row['text']))
+            for row in rows
+        ))
+        posts = [
+            Post(
+                pk=_integer(row.get('id')),
+                author_id=authors[row['author']],
+                group_id=groups.get(row.get('group')),
+                text=row['text'],
+                pub_date=_datetime(row.get('pub_date')),
+                image=row.get('image') or '',
+                image_width=_integer(row.get('image_width')),
+                image_height=_integer(row.get('image_height')),
+            )
+            for row in _fresh(
+                rows, lambda row: _integer(row.get('id')), existing
+            )
+        ]
+        Post.objects.bulk_create(posts, ignore_conflicts=True)
+        return len(posts)
+
+    def import_comments(self, rows):
+        """Комментарии к постам, которых нет в базе, пропускаются."""
+        authors = self.user_ids(row['author'] for row in rows)
+        posts = set(Post.objects.filter(
+            pk__in=[_integer(row['post']) for row in rows]
+        ).values_list('pk', flat=True))
+        rows = [row for row in rows if _integer(row['post']) in posts]
+        existing = {
+            pk: (post_id, author_id, text)
+            for pk, post_id, author_id, text in Comment.objects.filter(
+                pk__in=[_integer(row.get('id')) for row in rows]
+            ).values_list('pk', 'post_id', 'author_id', 'text')
+        }
+        _check_same('Комментарий', existing, (
+            (_integer(row.get('id')), (
+                _integer(row['post']), authors[row['author']], row['text']
+            ))
+            for row in rows
+        ))
+        comments = [
+            Comment(
+                pk=_integer(row.get('id')),
+                post_id=_integer(row['post']),
+                author_id=authors[row['author']],
+                text=row['text'],
+                created=_datetime(row.get('created')),
+            )
+            for row in _fresh(
+                rows, lambda row: _integer(row.get('id')), existing
+            )
+        ]
+        Comment.objects.bulk_create(comments, ignore_conflicts=True)
+        return len(comments)
+
+    def import_follows(self, rows):
+        """Ленты подписчиков дозаполняются в конце, по авторам."""
+        users = self.user_ids(
+            name for row in rows for name in (row['user'], row['author'])
+        )
+        rows = [row for row in rows if row['user'] != row['author']]
+        pairs = {(users[row['user']], users[row['author']]) for row in rows}
+        existing = set(Follow.objects.filter(
+            user_id__in={user_id for user_id, _ in pairs},
+            author_id__in={author_id for _, author_id in pairs},
+        ).values_list('user_id', 'author_id')) & pairs
+        follows = [
+            Follow(
+                user_id=users[row['user']],
+                author_id=users[row['author']],
+                created=_datetime(row.get('created')),
+            )
+            for row in _fresh(
+                rows,
+                lambda row: (users[row['user']], users[row['author']]),
+                existing,
+            )
+        ]
+        Follow.objects.bulk_create(follows, ignore_conflicts=True)
+        # И уже загруженные: прерванный импорт мог не дойти до finish()
+        self.author_ids.update(author_id for _, author_id in pairs)
+        return len(follows)
@@ -0,0 +1,178 @@
+import heapq
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import ActivityBucket, Comment, Follow, Group, Post, TrendingList
+
+REFRESHED_KEY = 'trending:refreshed'
+# Корзины старше окна не влияют на рейтинг и удаляются
+WINDOW = timedelta(hours=48)
+# Каждые HALF_LIFE часов вклад активности уменьшается вдвое
+HALF_LIFE = 6
+# Новый подписчик автора весит как несколько комментариев
+FOLLOW_WEIGHT = 3
+TOP_SIZE = 10
+# Списки лежат в таблице TrendingList, а в кэше — не дольше минуты:
+# так и при LocMemCache каждый воркер видит пересчёт не позже чем через
+# LIST_TIMEOUT секунд
+LIST_TIMEOUT = 60
+POSTS = 'posts'
+GROUPS = 'groups'
+GROUP = 'group'
+
+
+def _hour(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def _list_name(kind, group_id=None):
+    return f'{kind}:{group_id}' if group_id else kind
+
+
+def _list_key(kind, group_id=None):
+    return f'trending:{_list_name(kind, group_id)}'
+
+
+def aggregate(now=None, since=None):
+    """Пересчитывает часовые корзины, начиная с часа since.
+
+    since — время прошлого запуска, его хранит команда
+    aggregate_trending. Корзины этих часов не дополняются, а собираются
+    заново, поэтому повторный или прерванный запуск ничего не посчитает
+    дважды. Без since пересчитывается всё окно. Подписчик засчитывается
+    последнему посту автора на момент подписки. Возвращает число корзин.
+    """
+    now = now or timezone.now()
+    floor = _hour(now - WINDOW)
+    start = max(_hour(since), floor) if since else floor
+    counts = defaultdict(lambda: [0, 0])
+    comments = Comment.objects.filter(created__gte=start).annotate(
+        hour=TruncHour('created')
+    ).values('post', 'hour').annotate(count=Count('pk')).order_by()
+    for row in comments:
+        counts[row['post'], row['hour']][0] += row['count']
+    latest = Post.objects.filter(
+        author=OuterRef('author'), pub_date__lte=OuterRef('created')
+    ).order_by('-pub_date').values('pk')[:1]
+    follows = Follow.objects.filter(created__gte=start).annotate(
+        hour=TruncHour('created'), latest_post=Subquery(latest)
+    ).values('latest_post', 'hour').annotate(count=Count('pk')).order_by()
+    for row in follows:
+        if row['latest_post'] is not None:
+            counts[row['latest_post'], row['hour']][1] += row['count']
+    with transaction.atomic():
+        ActivityBucket.objects.filter(hour__gte=start).delete()
+        ActivityBucket.objects.filter(hour__lt=floor).delete()
+        ActivityBucket.objects.bulk_create([
+            ActivityBucket(
+                post_id=post_id, hour=hour,
+                comments=comments, follows=follows,
+            )
+            for (post_id, hour), (comments, follows) in counts.items()
+        ], batch_size=1000)
+    return len(counts)
+
+
+def _buckets(now, group_id=None):
+    buckets = ActivityBucket.objects.filter(hour__gte=now - WINDOW)
+    if group_id is not None:
+        buckets = buckets.filter(post__group_id=group_id)
+    return buckets.values_list(
+        'post_id', 'post__group_id', 'hour', 'comments', 'follows'
+    ).iterator()
+
+
+def rank(buckets, now):
+    """Оценки постов, групп и постов внутри групп с затуханием."""
+    posts = Counter()
+    groups = Counter()
+    by_group = defaultdict(Counter)
+    for post_id, group_id, hour, comments, follows in buckets:
+        age = (now - hour).total_seconds() / 3600
+        score = (comments + FOLLOW_WEIGHT * follows) * 0.5 ** (
+            age / HALF_LIFE
+        )
+        posts[post_id] += score
+        if group_id is not None:
+            groups[group_id] += score
+            by_group[group_id][post_id] += score
+    return posts, groups, by_group
+
+
+def _top(scores):
+    return [
+        pk for pk, _ in heapq.nlargest(
+            TOP_SIZE, scores.items(), key=lambda item: (item[1], item[0])
+        )
+    ]
+
+
+def refresh(now=None):
+    """Пересчитывает все списки топа и записывает их в TrendingList.
+
+    Читает только компактную таблицу корзин за окно. Списки заменяются
+    одной транзакцией, так что читатели не видят наполовину обновлённый
+    топ, а воркеры с собственным кэшем находят их в базе.
+    """
+    now = now or timezone.now()
+    posts, groups, by_group = rank(_buckets(now), now)
+    lists = {
+        _list_name(POSTS): _top(posts),
+        _list_name(GROUPS): _top(groups),
+    }
+    for group_id, scores in by_group.items():
+        lists[_list_name(GROUP, group_id)] = _top(scores)
+    with transaction.atomic():
+        TrendingList.objects.all().delete()
+        TrendingList.objects.bulk_create([
+            TrendingList(
+                key=name, ids=','.join(map(str, ids)), refreshed=now
+            )
+            for name, ids in lists.items()
+        ])
+    cache.delete_many([REFRESHED_KEY] + [
+        f'trending:{name}' for name in lists
+    ])
+    return len(lists)
+
+
+def refreshed_at():
+    """Когда списки пересчитывались последний раз, или None."""
+    refreshed = cache.get(REFRESHED_KEY)
+    if refreshed is None:
+        refreshed = TrendingList.objects.filter(
+            key=_list_name(POSTS)
+        ).values_list('refreshed', flat=True).first() or False
+        cache.set(REFRESHED_KEY, refreshed, LIST_TIMEOUT)
+    return refreshed or None
+
+
+def top_ids(kind, group_id=None):
+    """Список топа из кэша процесса, а при промахе — из TrendingList."""
+    key = _list_key(kind, group_id)
+    ids = cache.get(key)
+    if ids is None:
+        stored = TrendingList.objects.filter(
+            key=_list_name(kind, group_id)
+        ).values_list('ids', flat=True).first()
+        ids = [int(pk) for pk in stored.split(',')] if stored else []
+        cache.set(key, ids, LIST_TIMEOUT)
+    return ids
+
+
+def trending_posts(group_id=None):
+    ids = top_ids(GROUP if group_id else POSTS, group_id)
+    posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+    return [posts[pk] for pk in ids if pk in posts]
+
+
+def trending_groups():
+    ids = top_ids(GROUPS)
+    groups = Group.objects.in_bulk(ids)
+    return [groups[pk] for pk in ids if pk in groups]
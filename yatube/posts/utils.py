@@ -1,7 +1,158 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
 
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
 
-def paginate(request, posts, NUMBER_OF_POSTS):
-    paginator = Paginator(posts, NUMBER_OF_POSTS)
-    page_number = request.GET.get('page')
-    return paginator.get_page(page_number)
+# Сколько страниц ещё листаем по номерам, дальше переключаемся на курсоры
+MAX_NUMBERED_PAGES: int = 10
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(post, direction):
+    """Упаковывает ключ (pub_date, id) поста в токен для ?cursor=."""
+    raw = f'{direction}|{post.pub_date.isoformat()}|{post.pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Возвращает (direction, pub_date, id) или None для битого токена."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, pub_date, pk = raw.split('|')
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or pub_date is None:
+        return None
+    return direction, pub_date, pk
+
+
+class CursorPage(Page):
+    """Страница ленты, адресуемая курсором, а не номером."""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация по (pub_date, id) без COUNT(*) и OFFSET.
+
+    Стоимость любой страницы одинакова: индексный поиск по ключу
+    последнего показанного поста и выборка per_page + 1 строк.
+    """
+
+    def __init__(self, object_list, per_page):
+        super().__init__(
+            object_list.order_by('-pub_date', '-pk'), per_page
+        )
+
+    def page(self, cursor):
+        decoded = decode_cursor(cursor) if cursor else None
+        if decoded is None:
+            return self._forward(self.object_list, first=True)
+        direction, pub_date, pk = decoded
+        if direction == NEXT:
+            return self._forward(self.object_list.filter(
+                Q(pub_date__lt=pub_date) | Q(pub_date=pub_date, pk__lt=pk)
+            ))
+        return self._backward(self.object_list.filter(
+            Q(pub_date__gt=pub_date) | Q(pub_date=pub_date, pk__gt=pk)
+        ))
+
+    def get_page(self, cursor):
+        return self.page(cursor)
+
+    def _forward(self, posts, first=False):
+        rows = list(posts[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        next_cursor = (
+            encode_cursor(rows[-1], NEXT) if has_more else None
+        )
+        previous_cursor = (
+            encode_cursor(rows[0], PREVIOUS) if rows and not first else None
+        )
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def _backward(self, posts):
+        rows = list(
+            posts.order_by('pub_date', 'pk')[:self.per_page + 1]
+        )
+        if not rows:
+            return self._forward(self.object_list, first=True)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page][::-1]
+        next_cursor = encode_cursor(rows[-1], NEXT)
+        previous_cursor = (
+            encode_cursor(rows[0], PREVIOUS) if has_more else None
+        )
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+
+class CountedPaginator(Paginator):
+    """Paginator, который берёт число постов у счётчика, а не из COUNT(*).
+
+    Счётчик может быть приблизительным, поэтому номер страницы
+    не обрезается по num_pages, а выборка — по count.
+    """
+
+    def __init__(self, object_list, per_page, counter):
+        super().__init__(object_list, per_page)
+        self.counter = counter
+
+    @cached_property
+    def count(self):
+        return self.counter()
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if int(number) < 1:
+                raise
+            return int(number)
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
+
+
+def paginate(request, posts, NUMBER_OF_POSTS, counter=None):
+    """Нумерованные страницы для коротких лент, курсоры для длинных.
+
+    counter — необязательный вызываемый объект с числом постов
+    (см. posts.counters.PostCounter), избавляет от COUNT(*).
+    """
+    cursor = request.GET.get('cursor')
+    if cursor is None:
+        if counter is None:
+            paginator = Paginator(posts, NUMBER_OF_POSTS)
+        else:
+            paginator = CountedPaginator(posts, NUMBER_OF_POSTS, counter)
+        if (
+            'page' in request.GET
+            or paginator.num_pages <= MAX_NUMBERED_PAGES
+        ):
+            return paginator.get_page(request.GET.get('page'))
+    return CursorPaginator(posts, NUMBER_OF_POSTS).get_page(cursor)
@@ -1,57 +1,223 @@
+import json
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.views.decorators.cache import cache_page
+from django.views.decorators.http import condition, require_POST
 
+from . import follows, search, suggestions, thumbnails, trending
+from .caching import (INDEX_GENERATION_KEY, generation_modified, page_etag,
+                      request_etag, single_flight_cache_page)
+from .counters import GROUP, PostCounter, author_post_count, author_stats
+from .feeds import timeline
 from .forms import CommentForm, PostForm
-from .models import Comment, Follow, Group, Post, User
+from .models import Follow, Group, Post, User
 from .utils import paginate
 
 NUMBER_OF_POSTS: int = 10
-INDEX_CACHE_TIME = 20
+COMMENTS_PER_PAGE: int = 50
+# Сигналы сдвигают поколение главной только в кэше своего процесса,
+# поэтому надолго страница кэшируется лишь в общем кэше
+INDEX_CACHE_TIME = 60 * 60 * 3 if settings.CACHE_SHARED else 20
+
+
+def page_version(request, *args, **kwargs):
+    """ETag ленты по поколению кэша; без общего кэша ETag нет.
+
+    В LocMemCache у каждого воркера своё поколение: воркер, не видевший
+    записи, отвечал бы 304 на устаревшую страницу.
+    """
+    if settings.CACHE_SHARED:
+        return page_etag(request, INDEX_GENERATION_KEY)
+    return None
+
+
+def viewer_suggestions(request):
+    """Кого почитать; читается один раз, и для ETag, и для страницы."""
+    if not hasattr(request, '_follow_suggestions'):
+        request._follow_suggestions = (
+            suggestions.for_user(request.user)
+            if request.user.is_authenticated else []
+        )
+    return request._follow_suggestions
+
+
+def get_author(request, username):
+    """Автор со статистикой читается один раз: и для ETag, и для страницы."""
+    if not hasattr(request, '_author'):
+        request._author = User.objects.select_related('stats').filter(
+            username=username
+        ).first()
+    return request._author
+
+
+def viewer_follows(request, author):
+    """Подписан ли читатель на автора; и для ETag, и для страницы."""
+    if not hasattr(request, '_following'):
+        request._following = (
+            request.user.is_authenticated and Follow.objects.filter(
+                user=request.user, author=author
+            ).exists()
+        )
+    return request._following
+
+
+def profile_version(request, username):
+    """ETag профиля: версия страницы автора из AuthorStats.
+
+    Версию сдвигают сигналы при публикации, правке и удалении постов,
+    комментариях и переименовании автора или группы.
+    """
+    author = get_author(request, username)
+    if author is None:
+        return None
+    suggested = [user.pk for user in viewer_suggestions(request)]
+    return request_etag(
+        request, author_stats(author).version,
+        viewer_follows(request, author), suggested,
+    )
+
+
+def profile_modified(request, username):
+    author = get_author(request, username)
+    if author is None:
+        return None
+    return author_stats(author).modified
+
+
+def get_post(request, post_id):
+    """Пост страницы читается один раз: и для ETag, и для шаблона."""
+    if not hasattr(request, '_post'):
+        request._post = Post.objects.select_related(
+            'author__stats', 'group'
+        ).filter(pk=post_id).order_by().first()
+    return request._post
+
+
+def post_version(request, post_id):
+    """ETag страницы поста: версия карточки и число постов автора.
+
+    card_version растёт при правке поста, новом и удалённом
+    комментарии; номер страницы комментариев входит в адрес.
+    """
+    post = get_post(request, post_id)
+    if post is None:
+        return None
+    return request_etag(
+        request, post.card_version, author_post_count(post.author)
+    )
+
+
+def post_modified(request, post_id):
+    post = get_post(request, post_id)
+    if post is None:
+        return None
+    return latest(post.pub_date, post.last_commented_at)
+
+
+def latest(*moments):
+    return max(
+        (moment for moment in moments if moment is not None), default=None
+    )
+
+
+def page_modified(request, *args, **kwargs):
+    if settings.CACHE_SHARED:
+        return generation_modified(INDEX_GENERATION_KEY)
+    return None
 
 
-@cache_page(INDEX_CACHE_TIME, key_prefix='index_page')
+def group_version(request, slug):
+    if settings.CACHE_SHARED:
+        return page_etag(
+            request, INDEX_GENERATION_KEY, trending.refreshed_at()
+        )
+    return None
+
+
+def group_modified(request, slug):
+    """Страница группы меняется и с лентой, и с блоком популярного."""
+    if settings.CACHE_SHARED:
+        return latest(
+            generation_modified(INDEX_GENERATION_KEY),
+            trending.refreshed_at(),
+        )
+    return None
+
+
+# Неизменившаяся страница отдаётся ответом 304 до рендеринга шаблона
+@condition(etag_func=page_version, last_modified_func=page_modified)
+@single_flight_cache_page(
+    INDEX_CACHE_TIME,
+    key_prefix='index_page',
+    generation_key=INDEX_GENERATION_KEY,
+)
 def index(request):
     posts = Post.objects.select_related('author', 'group')
-    page_obj = paginate(request, posts, NUMBER_OF_POSTS)
+    page_obj = paginate(
+        request, posts, NUMBER_OF_POSTS, counter=PostCounter(posts)
+    )
+    thumbnails.prefetch(page_obj)
     context = {
         'page_obj': page_obj,
     }
     return render(request, 'posts/index.html', context)
 
 
+@condition(etag_func=group_version, last_modified_func=group_modified)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author')
-    page_obj = paginate(request, posts, NUMBER_OF_POSTS)
+    posts = group.posts.select_related('author', 'group')
+    page_obj = paginate(
+        request, posts, NUMBER_OF_POSTS,
+        counter=PostCounter(posts, GROUP, group.pk),
+    )
+    thumbnails.prefetch(page_obj)
     context = {
         'group': group,
         'page_obj': page_obj,
+        'trending': trending.trending_posts(group.pk),
     }
     return render(request, 'posts/group_list.html', context)
 
 
+@condition(etag_func=profile_version, last_modified_func=profile_modified)
 def profile(request, username):
-    current_author = get_object_or_404(User, username=username)
-    posts = current_author.posts.all()
-    following = (request.user.is_authenticated and Follow.objects.filter(
-        user=request.user,
-        author=current_author).exists()
+    current_author = get_author(request, username)
+    if current_author is None:
+        raise Http404
+    posts = current_author.posts.select_related('group')
+    following = viewer_follows(request, current_author)
+    post_count = author_post_count(current_author)
+    page_obj = paginate(
+        request, posts, NUMBER_OF_POSTS, counter=lambda: post_count
     )
-    page_obj = paginate(request, posts, NUMBER_OF_POSTS)
+    thumbnails.prefetch(page_obj)
     context = {
         'author': current_author,
+        'post_count': post_count,
         'page_obj': page_obj,
-        'following': following
+        'following': following,
+        'suggestions': viewer_suggestions(request),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@condition(etag_func=post_version, last_modified_func=post_modified)
 def post_detail(request, post_id):
-    selected_post = get_object_or_404(Post, pk=post_id)
-    post_count = selected_post.author.posts.count()
+    selected_post = get_post(request, post_id)
+    if selected_post is None:
+        raise Http404
+    post_count = author_post_count(selected_post.author)
     form = CommentForm()
-    comments = Comment.objects.filter(post=post_id)
+    comments = Paginator(
+        selected_post.comments.select_related('author')
+        .order_by('created', 'pk'),
+        COMMENTS_PER_PAGE,
+    ).get_page(request.GET.get('comments_page'))
 
     context = {
         'post': selected_post,
@@ -63,6 +229,31 @@ def post_detail(request, post_id):
     return render(request, 'posts/post_detail.html', context)
 
 
+def trending_index(request):
+    posts = trending.trending_posts()
+    thumbnails.prefetch(posts)
+    context = {
+        'posts': posts,
+        'groups': trending.trending_groups(),
+    }
+    return render(request, 'posts/trending.html', context)
+
+
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    posts, next_cursor = search.search(
+        query, request.GET.get('cursor'), NUMBER_OF_POSTS
+    )
+    thumbnails.prefetch(posts)
+    context = {
+        'query': query,
+        'posts': posts,
+        'next_cursor': next_cursor,
+        'is_first': not request.GET.get('cursor'),
+    }
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None,)
@@ -107,41 +298,69 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = post
-        comment.save()
+        # Счётчик комментариев у поста меняется вместе с самой записью
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    posts = (
-        Post.objects.filter(author__following__user=request.user)
-        .select_related('author', 'group')
-    )
+    posts = timeline(request.user).select_related('author', 'group')
     page_obj = paginate(request, posts, NUMBER_OF_POSTS)
+    thumbnails.prefetch(page_obj)
     context = {
         'page_obj': page_obj,
+        'suggestions': viewer_suggestions(request),
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
 def profile_follow(request, username):
-    user = User.objects.get(username=username)
-    if (
-        not User.objects.filter(
-            username=user,
-            following__user=request.user,
-        ).exists()
-        and user != request.user
-    ):
-
-        following = Follow.objects.create(user=request.user, author=user)
-        following.save()
+    follows.follow(request.user, [username])
     return redirect('posts:profile', username)
 
 
 @login_required
 def profile_unfollow(request, username):
-    user = User.objects.get(username=username)
-    Follow.objects.filter(user=request.user, author=user).delete()
+    follows.unfollow(request.user, [username])
     return redirect('posts:profile', username)
+
+
+def _usernames(payload, key):
+    usernames = payload.get(key, [])
+    if not isinstance(usernames, list) or not all(
+        isinstance(username, str) for username in usernames
+    ):
+        raise ValueError(f'{key} должен быть списком имён')
+    return usernames
+
+
+@login_required
+@require_POST
+def follow_bulk(request):
+    """Подписка и отписка сразу на многих авторов, JSON-запросом.
+
+    Тело: {"follow": [имена], "unfollow": [имена]}. Повтор того же
+    запроса ничего не меняет.
+    """
+    try:
+        payload = json.loads(request.body)
+        if not isinstance(payload, dict):
+            raise ValueError('ожидается объект')
+        to_follow = _usernames(payload, 'follow')
+        to_unfollow = _usernames(payload, 'unfollow')
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    if len(to_follow) + len(to_unfollow) > follows.MAX_BULK_FOLLOWS:
+        return JsonResponse(
+            {'error': f'не больше {follows.MAX_BULK_FOLLOWS} авторов'},
+            status=400,
+        )
+    followed, unknown = follows.follow(request.user, to_follow)
+    return JsonResponse({
+        'followed': followed,
+        'unfollowed': follows.unfollow(request.user, to_unfollow),
+        'unknown': unknown,
+    })
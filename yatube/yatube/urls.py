@@ -18,10 +18,13 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.views import profiling
+
 urlpatterns = [
     path('auth/', include('users.urls')),
     path('auth/', include('django.contrib.auth.urls')),
     path('', include('posts.urls', namespace='posts')),
+    path('admin/profiling/', profiling, name='profiling'),
     path('admin/', admin.site.urls),
     path('about/', include('about.urls', namespace='about')),
 ]